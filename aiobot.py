@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+'''Asynchronous execution core for the bots.
+
+The blocking mwclient calls run on a shared thread pool driven by an
+asyncio event loop, so no global monkey-patching is needed. If gevent
+has patched the sockets before anything was imported, e.g. with
+"python -m gevent.monkey banner.py ...", a gevent pool is used instead.
+'''
+
+import sys
+import asyncio
+import functools
+import threading
+import collections
+import concurrent.futures
+from bot import Bot, read_config
+
+
+class Pool:
+
+    def __init__(self, size=100):
+        'Prepare the worker threads for blocking calls.'
+        self.size = size
+        self.executor = concurrent.futures.ThreadPoolExecutor(size)
+
+    def imap(self, func, iterable):
+        'Apply the function concurrently, yielding the results in order.'
+        loop = asyncio.new_event_loop()
+        results = self._imap(func, iterable)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+
+    async def _imap(self, func, iterable):
+        'Keep up to the pool size of calls in flight.'
+        loop = asyncio.get_running_loop()
+        iterator = iter(iterable)
+        pending = collections.deque()
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.size:
+                    # listing the items may involve blocking requests, too
+                    item = await self.run(next, iterator, StopIteration)
+                    if item is StopIteration:
+                        exhausted = True
+                    elif asyncio.iscoroutinefunction(func):
+                        pending.append(loop.create_task(func(item)))
+                    else:
+                        pending.append(self.run(func, item))
+                if pending:
+                    yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def run(self, func, *args, **kwargs):
+        'Run a blocking call in the pool, returning an awaitable future.'
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return loop.run_in_executor(self.executor, call)
+
+
+class AsyncBot(Bot):
+
+    workers = 100
+    saves = 10  # saves in flight at once, whatever the rate limit
+
+    def __init__(self, *args, **kwargs):
+        'Share a pool of workers and HTTP connections among the pages.'
+        config = read_config('bot.ini', 'concurrency')
+        self.workers = config.get('workers', self.workers)
+        self.saves = config.get('saves', self.saves)
+        super().__init__(*args, **kwargs)  # one connection for each worker
+        self.pool = pool(self.workers)
+        self.saving = threading.BoundedSemaphore(self.saves)
+        self.stopped = threading.Event()  # the operator has quit
+
+    def _crawl(self, func, pages):
+        'Process the pages concurrently, checking them off in order.'
+        listed = collections.deque()
+
+        def pending():
+            for page in pages:
+                listed.append(page)
+                yield page
+
+        for result in self.pool.imap(func, pending()):
+            self.checkpoint.done(listed.popleft())
+            yield result
+
+    def _save(self, *args, **kwargs):
+        'Commit changes, waiting while too many saves are in flight.'
+        with self.saving:
+            return super()._save(*args, **kwargs)
+
+    def _choose(self):
+        'Ask about one page at a time, and no more once the operator quits.'
+        with self.console:
+            if self.stopped.is_set():  # the operator has quit already
+                raise SystemExit
+            try:
+                return super()._choose()
+            except SystemExit:
+                self.stopped.set()
+                raise
+
+
+def pool(size):
+    'Create a gevent pool if the sockets are patched, or an asyncio one.'
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey and monkey.is_module_patched('socket'):
+        import gevent.pool
+        return gevent.pool.Pool(size)
+    return Pool(size)
@@ -2,18 +2,20 @@
 
 '''Create redirects from airport codes.
 
-Usage: {0} <edit-summary> [minor]
+Usage: {0} <edit-summary> [minor] [--resume]
 Example: {0} "Create new redirect" m
 '''
 
 import re
-import gevent.monkey
-import gevent.pool
-from bot import Bot, main
+import collections
+import prefetch
+from aiobot import AsyncBot
+from bot import main
 
 
-class AirportBot(Bot):
+class AirportBot(AsyncBot):
 
+    cached = True
     template = 'Template:Infobox Airport'
     patterns = [
         r'\b%s\s*=\s*([A-Z]{%d})\b' % pair
@@ -24,29 +26,56 @@ class AirportBot(Bot):
     def __call__(self, edit_summary, minor=False):
         'Check all pages onto which the airport infobox is transcluded.'
         super().__call__(edit_summary, minor)
-        pages = self.site.pages[self.template].embeddedin()
-        for page in gevent.pool.Pool(100).imap(self._parse, pages):
-            pass
+        pages = self._embeddedin(self.template, namespaces={0})
+        self.codes = collections.OrderedDict()
+        self.parsed = []
+        for page, codes in self.pool.imap(self._parse, pages):
+            # check the codes before they would exceed a query
+            if len(self.codes) + len(codes) > prefetch.limit(self.site):
+                self._create_redirects()
+            self.parsed.append(page)
+            for code in codes:
+                self.codes.setdefault(code, page)
+        self._create_redirects()
         self._show_stat()
 
     def _parse(self, page):
         'Extract the airport codes from articles.'
-        if page.namespace:  # not in the article namespace, hence ignore it
-            return next(self)
-        for pattern in self.patterns:
-            match = re.search(pattern, page.text())
-            if match:
-                self._create_redirect(page, airport_code=match.group(1))
-
-    def _create_redirect(self, page, airport_code):
-        'Create a redirect page if the page title does not exist yet.'
-        redirect_page = self.site.pages[airport_code]
-        if redirect_page.exists:
-            return next(self)
-        else:
-            self._save(redirect_page, self.repl.format_map(vars()), '#')
+        contents = page.text()
+        matches = (re.search(pattern, contents) for pattern in self.patterns)
+        return page, [match.group(1) for match in matches if match]
+
+    def _create_redirects(self):
+        'Check the codes in bulk, and create the missing redirects.'
+        missing = []
+        if self.codes:
+            titles = '|'.join(self.codes)
+            infos, normalized, _ = prefetch.query(
+                self.site, titles=titles, **prefetch.PrefetchList.info)
+            infos = {info['title']: info for info in infos}
+            for airport_code, page in self.codes.items():
+                info = infos.get(normalized.get(airport_code, airport_code))
+                if info and 'missing' in info:
+                    redirect_page = prefetch.PrefetchedPage(
+                        self.site, info['title'], info)
+                    missing.append((redirect_page, page))
+                else:  # existing or invalid titles
+                    next(self)
+
+        for _ in self.pool.imap(self._create_redirect, missing):
+            pass
+
+        # the articles are finished only when their redirects are saved
+        for page in self.parsed:
+            self.checkpoint.done(page)
+        self.codes.clear()
+        self.parsed.clear()
+
+    def _create_redirect(self, item):
+        'Create a redirect page which does not exist yet.'
+        redirect_page, page = item
+        self._save(redirect_page, self.repl.format_map(vars()), '#')
 
 
 if __name__ == '__main__':
-    gevent.monkey.patch_all()
     main(AirportBot)
@@ -2,26 +2,18 @@
 
 '''Add WikiProject banners to talk pages.
 
-Usage: {0} <templates> <banner> <edit-summary> [minor]
+Usage: {0} <templates> <banner> <edit-summary> [minor] [--resume]
 Example: {0} "bd,BD" "WikiProject Biography" "Add banner" m
 '''
 
-import functools
-import gevent
-import gevent.lock
-import gevent.monkey
-import gevent.pool
-gevent.monkey.patch_all()
+from aiobot import AsyncBot
+from bot import main
+from matcher import Automaton
 
-from bot import Bot, main
 
+class BannerBot(AsyncBot):
 
-class BannerBot(Bot):
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.lock = gevent.lock.BoundedSemaphore()
-        self.pool = gevent.pool.Pool(100)
+    cached = True
 
     def __call__(self, templates, banner, edit_summary, minor=False):
         'Iterate through articles embedding the specified templates.'
@@ -31,52 +23,46 @@ class BannerBot(Bot):
         ns = 'Template:'
         banner_page = self.site.pages[ns + banner]
         self.variants = self._variants(banner_page)
+        self.banners = Automaton('{{' + tl for tl in self.variants)
 
         # check all pages embedding the specified templates
-        with open(__file__ + '.log', 'a', encoding='utf-8') as f:
-            for tl in templates.split(','):
-                pages = self.site.pages[ns + tl].embeddedin()
-                for page in self.pool.imap(self._evaluate, pages):
-                    print(page.pageid, page.name, sep='\t', file=f)
+        for tl in templates.split(','):
+            pages = self._embeddedin(ns + tl, talk=True, namespaces={0})
+            for page in self._crawl(self._evaluate, pages):
+                pass
 
         self._show_stat()
 
-    @staticmethod
-    def _pipe(func):
-        'Return the first parameter for pipelines.'
-
-        @functools.wraps(func)
-        def wrapper(self, param, *args, **kwargs):
-            func(self, param, *args, **kwargs)
-            return param
-
-        return wrapper
-
-    @_pipe.__func__
     def _evaluate(self, page):
         'Analyze the page contents to decide the next step.'
-        if page.namespace:  # not articles
-            return next(self)
-        else:  # navigate to its talk page
-            page = self.site.pages['Talk:' + page.name]
-
-        # find template messages in the talk page
-        contents = page.text()
-        already_included = any('{{' + tl in contents for tl in self.variants)
-        if already_included:
-            return next(self)
-        else:
-            result = '{{%s}}\n%s' % (self.variants[-1], contents)
+        page = self._talk(page)
 
+        banner = self.variants[-1]
         if self.minor:  # automatic mode
-            self._save(page, result, '*' if page.exists else '#')
+            verbose = '*' if page.exists else '#'
+            self._commit(page, self._insert, banner, verbose=verbose)
         else:  # manual mode
+            self._commit(page, self._preview, banner, confirm=True)
+
+    def _insert(self, page, banner):
+        'Put the banner on top of the talk page, unless it is there.'
+        # find template messages in the talk page
+        contents = page.text()
+        if self.banners.search(contents):  # already included
+            return None
+        return '{{%s}}\n%s' % (banner, contents)
+
+    def _preview(self, page, banner):
+        'Show the talk page to be confirmed, if the banner is missing.'
+        result = self._insert(page, banner)
+        if result is not None:
             self._info(page)
-            self._confirm(page, result)
+        return result
 
-    def _save(self, *args, **kwargs):
-        with self.lock:
-            super()._save(*args, **kwargs)
+    def _talk(self, page):
+        'Get the talk page, prefetched along with the article if possible.'
+        talk = getattr(page, 'talk', None)
+        return talk or self.site.pages['Talk:' + page.name]
 
 
 if __name__ == '__main__':
@@ -2,11 +2,12 @@
 
 '''Add WikiProject banners for T:Infobox rail-system route.
 
-Usage: {0} <edit-summary> [minor]
+Usage: {0} <edit-summary> [minor] [--resume]
 Example: {0} "Add banner" m
 '''
 
 from banner import BannerBot, main
+from matcher import Automaton
 
 
 class RailBannerBot(BannerBot):
@@ -25,41 +26,35 @@ class RailBannerBot(BannerBot):
         ns = 'Template:'
         for p, keys in self.projects.items():
             self.variants.extend(self._variants(self.site.pages[ns + p]))
-            self.keywords[p] = set()
-            print('Parsing keyword variants...', end=' ')
-            for k in keys.split(','):
-                print(k, end=' ')
-                self.keywords[p].update(self._dialects(k))
+            print('Parsing keyword variants...', keys, end=' ')
+            self.keywords[p] = self._dialects(*keys.split(','))
             print('Done.')
 
+        # a single pass over the text for all the banners or keywords
+        self.banners = Automaton('{{' + tl for tl in self.variants)
+        self.topics = Automaton(set().union(*self.keywords.values()))
+
     def __call__(self, edit_summary, minor=False):
         'Check all pages embedding the specified template.'
         super(BannerBot, self).__call__(edit_summary, minor)
         tl = 'T:Infobox rail system-route'
         with open(__file__ + '.log', 'a', encoding='utf-8') as f:
-            pages = self.site.pages[tl].embeddedin()
-            for title in self.pool.imap(self._evaluate, pages):
+            pages = self._embeddedin(
+                tl, talk=True, namespaces={0}, redirects=False)
+            for title in self._crawl(self._evaluate, pages):
                 if title:
                     print(title, file=f)
         self._show_stat()
 
     def _evaluate(self, page):
         'Analyze the talk page to decide the next step.'
-        if page.namespace or page.redirect:  # not articles
-            return next(self)
-        else:  # navigate to its talk page
-            page = self.site.pages['Talk:' + page.name]
-            if page.redirect:  # redirect page
-                return next(self)
-
-        # find template messages in the talk page
-        contents = page.text()
-        already_included = any('{{' + tl in contents for tl in self.variants)
-        if already_included:
+        page = self._talk(page)  # of an article, not a redirect
+        if page.redirect:  # redirect page
             return next(self)
 
+        found = self.topics.findall(page.name)
         for p, keywords in self.keywords.items():
-            if any(k in page.name for k in keywords):
+            if keywords & found:
                 banner = p
                 sure = True
                 break
@@ -67,11 +62,10 @@ class RailBannerBot(BannerBot):
             banner = '鐵道專題'
             sure = False
 
-        result = '{{%s}}\n%s' % (banner, contents)
-        self._save(page, result, '*' if page.exists else '#')
-
-        if not sure:
-            return page.page_title
+        verbose = '*' if page.exists else '#'
+        if self._commit(page, self._insert, banner, verbose=verbose):
+            if not sure:
+                return page.page_title
 
 
 if __name__ == '__main__':
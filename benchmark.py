@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+'''Measure the throughput of the bots against a local API stand-in.
+
+Usage: {0} [pages] [latency] [bots] [engine]
+       {0} diff [kilobytes] [edits]
+Example: {0} 1000 0.02 RegexBot,BannerBot gevent
+'''
+
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import importlib
+import contextlib
+import collections
+import multiprocessing
+from fakeapi import FakeAPI, FakeWiki, code
+
+# bot class -> module, arguments
+BENCHMARKS = collections.OrderedDict([
+    ('RegexBot', ('regex', [
+        'Infobox Airport', r'(IATA\s*=)', r'\1 ', 'Benchmark'])),
+    ('BannerBot', ('banner', [
+        'Benchmark', FakeWiki.banner, 'Benchmark', 'm'])),
+    ('AirportBot', ('airport', ['Benchmark', 'm'])),
+    ('RailwayBot', ('railway', ['Benchmark'])),
+])
+
+# a few entries of the local variant conversion tables
+TABLES = {
+    'zh2Hans': {'車': '车', '站臺': '站台', '機場': '机场'},
+    'zh2Hant': {'车': '車', '站台': '站臺', '机场': '機場'},
+}
+
+
+class Yes:
+    'Answer yes to every confirmation prompt.'
+
+    def readline(self):
+        return 'y\n'
+
+
+def stations(pages):
+    'Generate a station database matching the synthetic articles.'
+    items = (
+        '@bm{0}|Benchmark{0}|{1}|benchmark{0}|bm{0}|{0}'.format(i, code(i, 3))
+        for i in range(pages))
+    return "var station_names ='%s';" % ''.join(items)
+
+
+def run(module, name, args, host, conn, engine='asyncio'):
+    'Run a bot in non-interactive mode, and report its counters.'
+    if engine == 'gevent':  # patch before importing anything
+        import gevent.monkey
+        gevent.monkey.patch_all()
+    sys.stdin = Yes()
+    os.environ['XDG_STATE_HOME'] = os.getcwd()  # a fresh state for each run
+    try:
+        with open(os.devnull, 'w') as null, \
+                contextlib.redirect_stdout(null):
+            bot = getattr(importlib.import_module(module), name)(
+                host, scheme='http', path='/w/')
+            start = time.perf_counter()
+            try:
+                bot(*args)
+            except SystemExit:
+                pass
+            elapsed = time.perf_counter() - start
+    except Exception as err:
+        conn.send({'error': '{0.__class__.__name__}: {0}'.format(err)})
+        raise
+
+    counters = 'edited', 'ignored', 'errors', 'unknown'
+    conn.send(dict(
+        pages=sum(getattr(bot, i, 0) for i in counters),
+        elapsed=elapsed,
+        rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    ))
+
+
+def benchmark(name, pages=1000, latency=0, engine='asyncio'):
+    'Serve a fresh wiki and measure a single bot in a child process.'
+    module, args = BENCHMARKS[name]
+    wiki = FakeWiki(pages, latency)
+    server = FakeAPI(wiki).start()
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            with open('station_name.js', 'w', encoding='utf-8') as fp:
+                fp.write(stations(pages))
+            with open('zhconversion.json', 'w', encoding='utf-8') as fp:
+                json.dump(TABLES, fp, ensure_ascii=False)
+            child = context.Process(
+                target=run,
+                args=(module, name, args, server.host, sender, engine))
+            child.start()
+            sender.close()
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = {'error': 'exit code %s' % child.exitcode}
+            child.join()
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+
+    result['calls'] = sum(wiki.calls.values())
+    result['bytes'] = wiki.bytes
+    result['connections'] = server.connections
+    return result
+
+
+def report(name, result):
+    'Print a line of the results.'
+    if 'error' in result:
+        print('{0:<12} {1[error]}'.format(name, result))
+        return
+    pages = max(result['pages'], 1)
+    print('{0:<12} {1[pages]:>7} pages {2:>9.1f} pages/s {3:>7.2f} calls/page'
+          ' {4:>9.1f} KiB/page {5:>8.1f} MiB peak RSS {1[connections]:>5}'
+          ' connections'.format(
+              name, result, result['pages'] / result['elapsed'],
+              result['calls'] / pages, result['bytes'] / pages / 1024,
+              result['rss'] / 1024))
+
+
+def diff(size=200, edits=10, repeat=5):
+    'Compare the diff preview with and without the known spans.'
+    from bot import Bot
+    rows, length = [], 0
+    while length < size * 1024:
+        i = len(rows)
+        rows.append('|-\n| [[Benchmark{0}站]] || {1} || {0}\n'.format(
+            i, code(i, 3)))
+        length += len(rows[-1].encode())
+    text = ''.join(rows)
+    chosen = range(0, len(rows), max(len(rows) // edits, 1))
+    pattern = r'\[\[(Benchmark(?:%s)站)\]\]' % '|'.join(map(str, chosen))
+    result, spans = Bot._sub(pattern, r'[[\1|]]', text)
+
+    timings = collections.OrderedDict()
+    for name, args in ('difflib', ()), ('spans', (spans,)):
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as null, \
+                contextlib.redirect_stdout(null):
+            for _ in range(repeat):
+                Bot._diff(text, result, *args)
+        timings[name] = (time.perf_counter() - start) / repeat
+    for name, elapsed in timings.items():
+        print('{0:<12} {1:>7} KiB {2:>7} lines {3:>5} edits {4:>10.2f} ms'
+              .format(name, length // 1024, text.count('\n'), len(spans),
+                      elapsed * 1000))
+
+
+def main(argv=sys.argv):
+    'Parse command line options.'
+    if argv[1:2] == ['diff']:
+        try:
+            diff(*map(int, argv[2:4]))
+        except ValueError:
+            print(__doc__.format(argv[0]))
+        return
+    try:
+        pages = int(argv[1]) if len(argv) > 1 else 1000
+        latency = float(argv[2]) if len(argv) > 2 else 0
+        names = argv[3].split(',') if len(argv) > 3 else list(BENCHMARKS)
+        engine = argv[4] if len(argv) > 4 else 'asyncio'
+        assert all(name in BENCHMARKS for name in names)
+        assert engine in {'asyncio', 'gevent'}
+    except (ValueError, AssertionError):
+        print(__doc__.format(argv[0]))
+        return
+    for name in names:
+        report(name, benchmark(name, pages, latency, engine))
+
+
+if __name__ == '__main__':
+    main()
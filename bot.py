@@ -6,24 +6,73 @@ Usage: {0} <edit-summary> [minor]
 Example: {0} "Nothing of value" m
 '''
 
+import re
 import sys
-import time
+import itertools
 import collections
 import configparser
 import difflib
 import functools
+import threading
+import contextlib
 import mwclient
 import colorama
+import requests
+import dump
+import metrics
+import prefetch
+from checkpoint import Checkpoint
+from journal import Journal
+from plan import Plan
+from revcache import RevisionStore
+from scheduler import WriteScheduler
+from session import SessionCache
+from transport import Transport
+from variant import VariantConverter
+
+
+class EditConflict(Exception):
+    'The page has been edited since its wikitext was fetched.'
 
 
 class Bot:
 
+    plan = None  # the queue of proposed edits in the --plan mode
+    plannable = False  # whether the bot queues its edits with --plan
+    conflicts = {'editconflict', 'articleexists'}  # API error codes
+    workers = 10  # threads talking to the site at once
+    cached = False  # keep the revisions on disk for the next runs
+
     def __init__(self, host, username=None, password=None, *args, **kwargs):
         'Sign in with your MediaWiki account.'
         colorama.init()
         print('Connecting to %s...' % host, end=' ')
-        self.site = mwclient.Site(host, *args, **kwargs)
-        self.site.login(username, password)
+        config = read_config('bot.ini', 'transport')
+        config.setdefault('size', self.workers)
+        self.transport = Transport(**config)
+        kwargs.setdefault('compress', self.transport.compress)
+        kwargs.setdefault('connection_options', self.transport.options)
+        self.site = mwclient.Site(host, *args, do_init=False, **kwargs)
+        self.transport.mount(self.site.connection)
+        metrics.default.watch(self.site)
+        metrics.default.gauge('http', self.transport.stats)
+        metrics.default.configure(**read_config('bot.ini', 'metrics'))
+        self.session = SessionCache(**read_config('bot.ini', 'session'))
+        if not self.session.restore(self.site, username):
+            self.site.login(username, password)
+            self.session.save(self.site, username)
+        self.converter = VariantConverter(
+            self.site, **read_config('bot.ini', 'variant'))
+        self.store = None
+        if self.cached:
+            self.store = RevisionStore(**read_config('bot.ini', 'cache'))
+        self.scheduler = WriteScheduler(
+            self.site, **read_config('bot.ini', 'scheduler'))
+        self.site.pages = prefetch.PrefetchedPageList(self.site, self.store)
+        self.checkpoint = Checkpoint(**read_config('bot.ini', 'checkpoint'))
+        self.journal = Journal(**read_config('bot.ini', 'journal'))
+        self.console = threading.RLock()  # one page at a time asks
+        self.counting = threading.Lock()
         print('Ready.')
 
     def __call__(self, edit_summary, minor=False):
@@ -33,19 +82,45 @@ class Bot:
 
         self.ignored = 0
         self.edited = 0
+        self.planned = 0
         self.errors = 0
 
     def __next__(self):
         'Simple progress indicator.'
-        self.ignored += 1
+        self._count('ignored')
         print('.', end='')
 
+    def _count(self, counter):
+        'Increment a counter, which the workers may share.'
+        with self.counting:
+            setattr(self, counter, getattr(self, counter) + 1)
+
     @staticmethod
     def _info(page, *args, sep='', **kwargs):
         'Display the title and size of a page.'
         message = '\n{0.CYAN}{1.name}{0.GREEN} ({1.length}){0.RESET}'
         print(message.format(colorama.Fore, page), *args, sep=sep, **kwargs)
 
+    def _embeddedin(self, title, talk=False, **kwargs):
+        'List pages transcluding the title, with their wikitext prefetched.'
+        return prefetch.embeddedin(
+            self.site, title, talk, self.store, self.checkpoint, **kwargs)
+
+    def _backlinks(self, title, talk=False, **kwargs):
+        'List pages linking to the title, with their wikitext prefetched.'
+        return prefetch.backlinks(
+            self.site, title, talk, self.store, self.checkpoint, **kwargs)
+
+    def _candidates(self, pattern, namespaces=None):
+        'List pages from the dump matching the pattern, if there is one.'
+        config = read_config('bot.ini', 'dump')
+        if 'path' not in config:
+            return None
+        titles = dump.titles(
+            config['path'], pattern, namespaces, config.get('processes'))
+        return prefetch.candidates(self.site, titles, self.store)
+
+    @metrics.timed('convert')
     def _convert(self, **kwargs):
         'Convert between language variants, such as zh-CN and zh-TW.'
         return self.site.get('parse', **kwargs)['parse']['displaytitle']
@@ -59,10 +134,11 @@ class Bot:
             print(page.name, end=' > ')
             page = page.redirects_to()
 
-        # get all incoming redirects
-        variants = self._dialects(origin.page_title, **kwargs)
+        # get all incoming redirects, and convert them in batches
+        titles = [origin.page_title]
         for redirect in origin.backlinks(filterredir='redirects'):
-            variants.update(self._dialects(redirect.page_title, **kwargs))
+            titles.append(redirect.page_title)
+        variants = self._dialects(*titles, **kwargs)
 
         # move the origin to the end of list
         variants.discard(origin.page_title)
@@ -72,36 +148,142 @@ class Bot:
         print('Retrieved %d variants.' % len(variants))
         return variants
 
-    def _dialects(self, title, dialects='zh-cn,zh-hk,zh-mo,zh-sg,zh-tw'):
-        'List language variants of the title.'
+    def _dialects(self, *titles, dialects=VariantConverter.dialects):
+        'List language variants of the titles.'
         if not dialects:
-            return {title}
-        else:
-            dialects = dialects.split(',')
+            return set(titles)
         s = set()
-        for dialect in dialects:
-            s.add(self._convert(title=title, uselang=dialect))
+        for variants in self.converter(titles, dialects).values():
+            s.update(variants)
         return s
 
     @staticmethod
-    def _diff(x, y, **kwargs):
+    def _sub(pattern, repl, string):
+        'Do regular expression substitute, keeping the replaced spans.'
+        spans = [
+            (m.start(), m.end(), repl(m) if callable(repl) else m.expand(repl))
+            for m in re.finditer(pattern, string)]
+        return Bot._apply(string, spans), spans
+
+    @staticmethod
+    def _str_replace(string, old, new):
+        'Replace all the occurrences of a substring, keeping the spans.'
+        spans, i = [], string.find(old) if old else -1
+        while i >= 0:
+            spans.append((i, i + len(old), new))
+            i = string.find(old, i + len(old))
+        return Bot._apply(string, spans), spans
+
+    @staticmethod
+    def _apply(string, spans):
+        'Replace the sorted, non-overlapping (start, end, repl) spans.'
+        pieces, last = [], 0
+        for start, end, repl in spans:
+            pieces += string[last:start], repl
+            last = end
+        pieces.append(string[last:])
+        return ''.join(pieces)
+
+    @staticmethod
+    def _hunks(x, spans, n=3, fromfile='', tofile=''):
+        'Diff only the lines around the known spans of changes.'
+        if not spans:
+            return
+        headers = ['--- ' + fromfile, '+++ ' + tofile]
+
+        # widen each span to whole lines, plus n lines of context
+        regions = []
+        for start, end, repl in spans:
+            a = x.rfind('\n', 0, start) + 1
+            for _ in range(n):
+                a = x.rfind('\n', 0, a - 1) + 1 if a else 0
+            b = x.find('\n', end) + 1 or len(x)
+            for _ in range(n):
+                b = x.find('\n', b) + 1 or len(x)
+            if regions and a <= regions[-1][1]:  # overlapping contexts
+                first, last, local = regions[-1]
+                regions[-1][1] = max(b, last)
+                local.append((start - first, end - first, repl))
+            else:
+                regions.append([a, b, [(start - a, end - a, repl)]])
+
+        header = re.compile(r'^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@$')
+        offset, shift, last = 0, 0, 0
+        for a, b, local in regions:
+            old = x[a:b]
+            new = Bot._apply(old, local)
+            offset += x.count('\n', last, a)
+            last = a
+            diff = difflib.unified_diff(
+                old.splitlines(), new.splitlines(), lineterm='', n=n)
+            for text in itertools.islice(diff, 2, None):
+                yield from headers  # once, and only if a line has changed
+                headers = []
+                m = header.match(text)
+                if m:
+                    text = '@@ -{0}{1} +{2}{3} @@'.format(
+                        int(m.group(1)) + offset, m.group(2) or '',
+                        int(m.group(3)) + offset + shift, m.group(4) or '')
+                yield text
+            shift += new.count('\n') - old.count('\n')
+
+    @staticmethod
+    def _diff(x, y, spans=None, **kwargs):
         'Generate a summary of changes in "diff" style.'
+        rendered = Bot._render(x, y, spans, **kwargs)
+        if rendered:
+            print(rendered)
+
+    @staticmethod
+    @metrics.timed('diff')
+    def _render(x, y, spans=None, color=True, **kwargs):
+        'Render the summary of changes, to be printed at once.'
+        if spans is None:  # unknown changes, compare the whole pages
+            x, y = x.splitlines(), y.splitlines()
+            lines = difflib.unified_diff(x, y, lineterm='', **kwargs)
+        else:
+            lines = Bot._hunks(x, spans, **kwargs)
+        return '\n'.join(Bot._colorize(lines) if color else lines)
+
+    @staticmethod
+    def _colorize(lines):
+        'Color the added, removed and header lines of a diff.'
         colors = {
             '+': colorama.Fore.GREEN,
             '-': colorama.Fore.RED,
             '@': colorama.Fore.YELLOW,
         }
-        x, y = x.splitlines(), y.splitlines()
-        for line in difflib.unified_diff(x, y, lineterm='', **kwargs):
+        for line in lines:
             for prefix, color in colors.items():
                 if line.startswith(prefix):
-                    print(color, line, colorama.Fore.RESET, sep='')
+                    yield color + line + colorama.Fore.RESET
                     break
             else:
-                print(line)
+                yield line
+
+    def _lookahead(self, func, items):
+        'Prepare the next items in the background during the review.'
+        size = read_config('bot.ini', 'review').get('lookahead', 10)
+        return prefetch.Lookahead(func, items, size)
+
+    def _queue(self, page, result, diff=None, spans=None):
+        'Add the proposed edit to the plan, instead of saving it.'
+        if diff is None:
+            diff = self._render(page.text(), result, spans, color=False)
+        if not diff:  # nothing changed
+            return next(self)
+        self.plan.add(page, result, diff, self.edit_summary, self.minor)
+        self._count('planned')
+        print('+', end='')
 
     def _confirm(self, *args, verbose=True, **kwargs):
         'Confirm the changes.'
+        if self._choose():
+            return self._save(*args, **kwargs, verbose=verbose)
+        self._count('ignored')
+
+    def _choose(self):
+        'Ask whether to save the changes, or to quit.'
         prompt = '{0.YELLOW}Replace? [Y/n/q]: {0.RESET}'.format(colorama.Fore)
         while True:
             try:
@@ -110,17 +292,40 @@ class Bot:
                 choice = 'q'
 
             if choice in {'yes', 'y', ''}:
-                return self._save(*args, **kwargs, verbose=verbose)
+                return True
             elif choice in {'no', 'n'}:
-                self.ignored += 1
-                return
+                return False
             elif choice in {'quit', 'q'}:
-                self.ignored += 1
+                self._count('ignored')
                 self._show_stat()
                 sys.exit()
             else:
                 self._invalid(choice)
 
+    def _commit(self, page, edit, *args, confirm=False, max_conflicts=3,
+                **kwargs):
+        'Save an edit of the page, redoing it after edit conflicts.'
+        if confirm:
+            kwargs.setdefault('verbose', True)
+        for _ in range(max_conflicts):
+            # the operator reviews one page at a time, but not its save
+            with self.console if confirm else contextlib.nullcontext():
+                result = edit(page, *args)
+                if result is None:  # nothing to change
+                    return next(self)
+                if confirm and not self._choose():
+                    return self._count('ignored')
+            try:
+                return self._save(
+                    page, result, raise_conflicts=True, **kwargs)
+            except EditConflict:
+                # fetch the latest revision, and compute the edit again
+                page = prefetch.fetch(
+                    self.site, [page.name], self.store).get(page.name)
+                if page is None:  # deleted in the meantime
+                    break
+        self._count('errors')
+
     @staticmethod
     def _invalid(command):
         'Print warning message for invalid operations.'
@@ -128,50 +333,85 @@ class Bot:
         print(message.format(colorama.Fore, command))
 
     @staticmethod
-    def _retry(func, max_retries=5, interval=60, min_interval=10):
-        'Retry operation in case of failure.'
+    def _retry(func, max_retries=5):
+        'Retry operation in case of failure, paced by the write scheduler.'
 
         @functools.wraps(func)
-        def wrapper(self, *args, **kwargs):
+        def wrapper(self, *args, raise_conflicts=False, **kwargs):
             for count in range(max_retries):
+                self.scheduler.acquire()
                 try:
-                    func(self, *args, **kwargs)
+                    result = func(self, *args, **kwargs)
+                except EditConflict as err:
+                    if raise_conflicts:  # the caller computes it again
+                        raise
+                    print('{0.__class__.__name__}: {0}'.format(err))
+                    self._count('ignored')
+                    return
                 except mwclient.ProtectedPageError:
-                    self.errors += 1
+                    self._count('errors')
                     return
-                except mwclient.MwClientError as err:
+                except (mwclient.MwClientError,
+                        requests.exceptions.RequestException) as err:
                     print('{0.__class__.__name__}: {0}'.format(err))
-                    if count == max_retries - 1:
-                        self.errors += 1
+                    # one backoff shared by all the workers, but none for
+                    # the failures of the page, which would fail again
+                    if count == max_retries - 1 \
+                            or not self.scheduler.failed(err, count):
+                        self._count('errors')
                         return
-                    else:  # incremental backoff strategy
-                        time.sleep(max(count * interval, min_interval))
+                    metrics.default.retried()
                 else:
-                    self.edited += 1
-                    return
+                    self._count('edited')
+                    return result
 
         return wrapper
 
     @_retry.__func__
+    @metrics.timed('save')
     def _save(self, page, result, verbose=False):
         'Commit changes to MediaWiki.'
         if verbose is True:
             print('Saving...', end=' ')
 
-        page.save(result, self.edit_summary, self.minor)
+        # the base timestamp is sent for existing pages, as is createonly
+        # for new ones, so that the edits made since the fetch are kept
+        params = dict(self.scheduler.params)
+        if not page.exists:
+            params['createonly'] = 1
+        try:
+            response = page.save(result, self.edit_summary, self.minor,
+                                 **params)
+        except mwclient.MwClientError as err:
+            # not worth retrying, the edit has to be computed again
+            error = err.__context__ if err.__context__ else err
+            if getattr(error, 'code', None) in self.conflicts:
+                raise EditConflict(page.name) from err
+            raise
+
+        if 'newrevid' in response:  # not a null edit
+            self.journal.record(
+                'edit', page.name, response.get('pageid'),
+                response.get('oldrevid'), response['newrevid'],
+                self.edit_summary)
 
         if verbose is True:
             print('Done.')
         elif verbose:
             print(verbose, end='')
+        return response
 
     def _show_stat(self):
-        'Show the number of edited and ignored pages.'
+        'Show the number of edited and ignored pages, and the metrics.'
         items = ['total', 'edited', 'ignored', 'errors']
+        if self.plan is not None:
+            items[1] = 'planned'
         self.total = sum(getattr(self, i) for i in items[1:])
         pattern = ', '.join('{{0.{0}}} {0}'.format(i) for i in items)
         message = '\n{0.RED}{1}{0.RESET}'
         print(message.format(colorama.Fore, pattern.format(self)), sep='')
+        print(metrics.default.summary())
+        metrics.default.snapshot()
 
 
 def read_config(filenames, section=configparser.DEFAULTSECT):
@@ -199,9 +439,16 @@ def read_config(filenames, section=configparser.DEFAULTSECT):
 
 def main(bot, argc=2, argv=sys.argv):
     'Parse command line options.'
+    flags = {'--resume', '--plan'}.intersection(argv)
+    argv = [arg for arg in argv if arg not in flags]
     try:
         assert argc <= len(argv) <= argc + 1
+        assert bot.plannable or '--plan' not in flags
         b = bot(**read_config('bot.ini', 'general'))
+        if '--plan' in flags:  # queue the edits for review.py
+            b.plan = Plan(**read_config('bot.ini', 'plan'))
+        b.checkpoint.start([bot.__name__] + argv[1:], '--resume' in flags)
+        b.journal.start([bot.__name__] + argv[1:])
         b(*argv[1:])
     except AssertionError:  # print the docstring as help message
         import __main__
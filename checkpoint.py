@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+'''Checkpoints of long crawls, to resume them after a crash.
+
+For each list of a job, the continuation of the batch in progress and
+the pages already processed are recorded, so that a resumed job starts
+from that batch and skips the finished pages without fetching them.
+'''
+
+import json
+import threading
+import state
+
+
+class Checkpoint:
+
+    path = 'checkpoint.sqlite3'
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS lists (
+            job TEXT NOT NULL,
+            name TEXT NOT NULL,
+            continuation TEXT NOT NULL,
+            PRIMARY KEY (job, name)
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            job TEXT NOT NULL,
+            name TEXT NOT NULL,
+            pageid INTEGER NOT NULL,
+            PRIMARY KEY (job, name, pageid)
+        );
+    '''
+
+    def __init__(self, path=None):
+        'Open the checkpoints, outside of any job.'
+        self.lock = threading.RLock()
+        self.db = state.connect(self.path, self.schema, path, wal=True)
+        self.job = None  # nothing is recorded outside of a job
+        self.positions = {}
+
+    def start(self, job, resume=False):
+        'Identify the job, and forget its last run unless resumed.'
+        self.job = json.dumps(job, ensure_ascii=False)
+        self.positions.clear()
+        if not resume:
+            with self.lock, self.db:
+                for table in 'lists', 'pages':
+                    self.db.execute(
+                        'DELETE FROM %s WHERE job = ?' % table, (self.job,))
+
+    def load(self, name):
+        'Get the saved continuation of the list, and the finished pageids.'
+        if self.job is None:
+            return {}, set()
+        with self.lock:
+            row = self.db.execute(
+                'SELECT continuation FROM lists WHERE job = ? AND name = ?',
+                (self.job, name)).fetchone()
+            done = self.db.execute(
+                'SELECT pageid FROM pages WHERE job = ? AND name = ?',
+                (self.job, name)).fetchall()
+        continuation = json.loads(row[0]) if row else {}
+        self.positions[name] = continuation
+        return continuation, {i for i, in done}
+
+    def done(self, page):
+        'Record the page, and the batch that it came from, as processed.'
+        position = getattr(page, 'position', None)
+        if self.job is None or position is None:
+            return
+        name, continuation = position
+        with self.lock, self.db:
+            if self.positions.get(name) != continuation:
+                # the pages come in order, so the previous batch is over
+                self.positions[name] = continuation
+                self.db.execute(
+                    'INSERT OR REPLACE INTO lists VALUES (?, ?, ?)',
+                    (self.job, name, json.dumps(continuation)))
+                self.db.execute(
+                    'DELETE FROM pages WHERE job = ? AND name = ?',
+                    (self.job, name))
+            self.db.execute(
+                'INSERT OR IGNORE INTO pages VALUES (?, ?, ?)',
+                (self.job, name, page.pageid))
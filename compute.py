@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+'''Compute stage for CPU-bound substitutions.
+
+The pattern, replacement and wikitext are shipped to a pool of worker
+processes, which compile each pattern only once, so that heavy regular
+expressions neither block the I/O workers nor stay on a single core.
+'''
+
+import re
+import time
+import functools
+import collections
+import multiprocessing
+import concurrent.futures
+import metrics
+from bot import Bot
+
+
+class Inline(concurrent.futures.Executor):
+    'Run the calls right away in the calling thread.'
+
+    def submit(self, func, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as err:
+            future.set_exception(err)
+        return future
+
+
+class Compute:
+
+    processes = 0  # substitute in the calling thread by default
+    ahead = 100  # pages submitted before the first result is needed
+
+    def __init__(self, processes=None, ahead=None):
+        'Start the worker processes, if any.'
+        self.processes = processes or self.processes
+        self.ahead = ahead or self.ahead
+        if self.processes:
+            context = multiprocessing.get_context('spawn')
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes, context)
+        else:
+            self.executor = Inline()
+
+    def sub(self, pattern, repl, text):
+        'Substitute in the background, returning a future of the result.'
+        return self.executor.submit(substitute, pattern, repl, text)
+
+    def imap(self, pattern, repl, pages):
+        'Yield the pages in order, each with its result.'
+        window = collections.deque()
+        for page in pages:
+            window.append((page, self.sub(pattern, repl, page.text())))
+            if len(window) > self.ahead:
+                yield result(*window.popleft())
+        while window:
+            yield result(*window.popleft())
+
+
+def result(page, future):
+    'Wait for the result of the page, and record the time it took.'
+    value, seconds = future.result()
+    # recorded here, as the metrics of the worker processes are lost
+    metrics.default.record('regex', seconds)
+    return page, value
+
+
+@functools.lru_cache(maxsize=None)
+def compiled(pattern):
+    'Compile the pattern once in each worker.'
+    return re.compile(pattern)
+
+
+def substitute(pattern, repl, text):
+    'Do regular expression substitute, timing it in the worker.'
+    start = time.perf_counter()
+    value = Bot._sub(compiled(pattern), repl, text)
+    return value, time.perf_counter() - start
@@ -2,7 +2,7 @@
 
 '''Remove colored text from metro station articles.
 
-Usage: {0} <cities> [minor]
+Usage: {0} <cities> [minor] [--plan]
 Example: {0} nanchang,shenzhen m
 '''
 
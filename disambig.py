@@ -27,11 +27,19 @@ class Disambiguator(BacklinkBot):
             self.disambig_page = self.site.pages[variants[-1]]
         self._reset_links()
 
-        for page in self.disambig_page.backlinks(filterredir='nonredirects'):
-            self._menu_main(page)
+        pages = self._backlinks(self.disambig_page.name, redirects=False)
+        with self._lookahead(self._fetch, pages) as pages:
+            for page in pages:
+                self._menu_main(page)
 
         self._show_stat()
 
+    @staticmethod
+    def _fetch(page):
+        'Load the wikitext while the previous page is in the menu.'
+        page.text()
+        return page
+
     def _menu_main(self, page, silent=False):
         'Show the main menu.'
         silent or self._info(page, end='\n\n')
@@ -57,7 +65,7 @@ class Disambiguator(BacklinkBot):
             self._invalid(choice)
             return self._menu_main(page, silent=True)
         except AssertionError:
-            self.ignored += 1
+            self._count('ignored')
             return
         else:
             return self._replace(page, self.regex, correct_link, raw=True)
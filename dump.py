@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+'''Find the candidate pages in a database dump, instead of searching.
+
+Usage: {0} <dump> <pattern> [namespaces]
+Example: {0} zhwiki-latest-pages-articles.xml.bz2 infomation 0 > titles.txt
+'''
+
+import re
+import sys
+import bz2
+import gzip
+import multiprocessing
+import xml.etree.ElementTree as ET
+
+DUMPS = '.xml', '.xml.bz2', '.xml.gz'
+pattern = None  # compiled once in each worker
+
+
+def is_dump(path):
+    'Tell a dump from a plain list of titles by its name.'
+    return path.endswith(DUMPS)
+
+
+def open_dump(path):
+    'Open the dump as a stream, decompressing it on the fly.'
+    if path.endswith('.bz2'):
+        return bz2.open(path)
+    elif path.endswith('.gz'):
+        return gzip.open(path)
+    return open(path, 'rb')
+
+
+def pages(path, namespaces=None):
+    'Yield the namespace, title and wikitext of each page in the dump.'
+    with open_dump(path) as fp:
+        context = ET.iterparse(fp, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end' or tag(elem) != 'page':
+                continue
+            fields = {tag(child): child for child in elem.iter()}
+            ns = int(fields['ns'].text)
+            if namespaces is None or ns in namespaces:
+                text = fields.get('text')
+                text = text.text if text is not None else None
+                yield ns, fields['title'].text, text or ''
+            root.clear()  # drop the finished pages to bound the memory
+
+
+def tag(elem):
+    'Strip the XML namespace from the tag.'
+    return elem.tag.rpartition('}')[2]
+
+
+def scan(path, regex, namespaces=None, processes=None, chunksize=16):
+    'Yield the titles of the pages matching the pattern, in dump order.'
+    # spawned, as forking a process with threads and connections is unsafe
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, prepare, (regex,)) as pool:
+        items = pages(path, namespaces)
+        for title in pool.imap(match, items, chunksize):
+            if title is not None:
+                yield title
+
+
+def titles(path, regex=None, namespaces=None, processes=None):
+    'Read the candidate titles, scanning the dump if it is not a list.'
+    if is_dump(path):
+        yield from scan(path, regex, namespaces, processes)
+        return
+    with open(path, encoding='utf-8') as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def prepare(regex):
+    'Prepare the pattern in a worker process.'
+    global pattern
+    pattern = re.compile(regex)
+
+
+def match(item):
+    'Return the title if the page matches the pattern.'
+    ns, title, text = item
+    return title if pattern.search(text) else None
+
+
+def main(argv=sys.argv):
+    'Parse command line options.'
+    try:
+        assert 3 <= len(argv) <= 4
+        namespaces = None
+        if len(argv) > 3:
+            namespaces = {int(i) for i in argv[3].split(',')}
+    except (AssertionError, ValueError):
+        print(__doc__.format(argv[0]))
+        return
+    for title in scan(argv[1], argv[2], namespaces):
+        print(title, flush=True)
+
+
+if __name__ == '__main__':
+    main()
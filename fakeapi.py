@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+
+'''Local stand-in for the MediaWiki API, serving synthetic pages.
+
+Usage: {0} [pages] [latency] [port]
+Example: {0} 1000 0.05 8080
+'''
+
+import re
+import sys
+import gzip
+import zlib
+import json
+import time
+import string
+import threading
+import collections
+import http.server
+import urllib.parse
+
+
+class FakeWiki:
+
+    namespaces = collections.OrderedDict([
+        (0, ''), (1, 'Talk'), (2, 'User'), (3, 'User talk'),
+        (4, 'Project'), (5, 'Project talk'),
+        (10, 'Template'), (11, 'Template talk'),
+    ])
+    aliases = {'T': 10, 'WP': 4}
+    username = 'Benchmark'
+    rights = ['read', 'edit', 'createpage', 'move', 'apihighlimits']
+
+    banner = 'WikiProject Benchmark'
+    templates = [
+        'Infobox China railway station', 'Infobox Airport', 'Benchmark',
+    ]
+    content = '''\'\'\'{title}\'\'\' is a synthetic page.
+
+{{{{Infobox China railway station
+|车站名称 = {title}
+|英文名称 = Station {i}
+|车站代码 = {i}
+|other = x
+}}}}
+{{{{Infobox Airport
+|IATA = {iata}
+|ICAO = {icao}
+}}}}
+{{{{Benchmark|{i}}}}}
+'''
+    filler = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n'
+
+    link_pattern = r'\{\{\s*([^|{}\n]+?)\s*[|}]'
+    redirect_pattern = r'(?i)#REDIRECT\s*\[\[([^\]|]+)'
+
+    def __init__(self, pages=1000, latency=0, filler=20):
+        'Populate the wiki with synthetic articles and talk pages.'
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.pages = collections.OrderedDict()
+        self.revisions = {}
+        self.calls = collections.Counter()
+        self.bytes = 0
+        self.clock = 1500000000
+        self.last_pageid = self.last_revid = 0
+
+        self.save('Template:' + self.banner, 'Banner')
+        self.save('Template:WPBM', '#REDIRECT [[Template:%s]]' % self.banner)
+        for tl in self.templates:
+            self.save('Template:' + tl, '<includeonly>...</includeonly>')
+        for i in range(pages):
+            title = self.title(i)
+            text = self.content.format(
+                title=title, i=i, iata=code(i, 3), icao=code(i, 4))
+            self.save(title, text + self.filler * filler)
+            if i % 2:  # half of the talk pages exist already
+                banner = '{{%s}}\n' % self.banner if i % 4 == 1 else ''
+                self.save('Talk:' + title, banner + 'Discussion.')
+
+    @staticmethod
+    def title(i):
+        'Generate the title of a synthetic article.'
+        return 'Benchmark%d站' % i
+
+    def normalize(self, title):
+        'Normalize a title like MediaWiki does.'
+        title = title.replace('_', ' ').strip()
+        prefix, colon, rest = title.partition(':')
+        ns = self.namespace(prefix) if colon else 0
+        if ns:
+            title = '%s:%s' % (self.namespaces[ns], rest.strip())
+            rest = rest.strip()
+        else:
+            rest = title
+        if rest[:1].islower():
+            title = title[:len(title) - len(rest)] + rest[0].upper() + rest[1:]
+        return title
+
+    def namespace(self, prefix):
+        'Get the namespace number of a title prefix.'
+        prefix = prefix.replace('_', ' ').strip().lower()
+        for ns, name in self.namespaces.items():
+            if ns and name.lower() == prefix:
+                return ns
+        return self.aliases.get(prefix.upper(), 0)
+
+    def save(self, title, text, summary='', user=None):
+        'Store a new revision, creating the page if necessary.'
+        title = self.normalize(title)
+        self.clock += 1
+        self.last_revid += 1
+        page = self.pages.get(title)
+        if page is None:
+            self.last_pageid += 1
+            ns = self.namespace(title.partition(':')[0]) if ':' in title else 0
+            page = self.pages[title] = dict(
+                pageid=self.last_pageid, ns=ns, title=title, revisions=[])
+        rev = dict(
+            revid=self.last_revid, parentid=page['revisions'][-1]['revid']
+            if page['revisions'] else 0, timestamp=timestamp(self.clock),
+            user=user or self.username, comment=summary, text=text,
+            page=page,
+        )
+        page['revisions'].append(rev)
+        self.revisions[rev['revid']] = rev
+        page['templates'] = set(
+            self.normalize('Template:' + t)
+            for t in re.findall(self.link_pattern, text))
+        target = re.match(self.redirect_pattern, text)
+        page['redirect'] = self.normalize(target.group(1)) if target else None
+        return page, rev
+
+    def __call__(self, params):
+        'Dispatch an API request.'
+        time.sleep(self.latency)
+        action = params.get('action', '')
+        with self.lock:
+            self.calls[action] += 1
+            try:
+                handler = getattr(self, 'action_' + action)
+            except AttributeError:
+                return error('unknown_action', action)
+            return handler(params)
+
+    def action_login(self, params):
+        'Accept any credentials.'
+        return {'login': {'result': 'Success', 'lgusername': self.username}}
+
+    def action_parse(self, params):
+        'Pretend to parse, without any language conversion.'
+        if 'text' in params:
+            text = params['text'].replace('<nowiki/>', '')
+            if params.get('onlypst'):
+                return {'parse': {'text': {'*': text}}}
+            html = '<div class="mw-parser-output"><p>%s\n</p></div>' % (
+                text.replace('&', '&amp;').replace('<', '&lt;'))
+            return {'parse': {'text': {'*': html}}}
+        elif 'pageid' in params:
+            title = self.page_by_id(params['pageid'])['title']
+        else:
+            title = self.normalize(params.get('title', 'API'))
+        return {'parse': {'title': title, 'displaytitle': title}}
+
+    def action_edit(self, params):
+        'Save a page, detecting edit conflicts from the base timestamp.'
+        if 'pageid' in params:
+            title = self.page_by_id(params['pageid']).get('title', '')
+        else:
+            title = self.normalize(params['title'])
+        page = self.pages.get(title)
+        old = page['revisions'][-1] if page else None
+        base = params.get('basetimestamp')
+        if old and base and digits(old['timestamp']) > digits(base):
+            return error('editconflict', 'Edit conflict.')
+        if old and params.get('createonly'):
+            return error('articleexists', 'The page already exists.')
+        text = params.get('text')
+        if 'undo' in params:  # only the latest revisions can be undone
+            if not old or old['revid'] != int(params['undo']):
+                return error('undofailure', 'The edit could not be undone.')
+            text = self.revisions[int(params['undoafter'])]['text']
+        if text is None:
+            text = old['text'] if old else ''
+            text = params.get('prependtext', '') + text
+            text += params.get('appendtext', '')
+        page, rev = self.save(title, text, params.get('summary', ''))
+        return {'edit': {
+            'result': 'Success', 'pageid': page['pageid'], 'title': title,
+            'oldrevid': old['revid'] if old else 0, 'newrevid': rev['revid'],
+            'newtimestamp': rev['timestamp'],
+        }}
+
+    def action_move(self, params):
+        'Rename a page and leave a redirect behind.'
+        src = self.normalize(params['from'])
+        dest = self.normalize(params['to'])
+        page = self.pages.pop(src)
+        page['title'] = dest
+        self.pages[dest] = page
+        self.save(src, '#REDIRECT [[%s]]' % dest, params.get('reason', ''))
+        return {'move': {'from': src, 'to': dest}}
+
+    def action_query(self, params):
+        'Handle meta, list, generator and prop queries.'
+        result = {}
+        meta = params.get('meta', '').split('|')
+        if 'siteinfo' in meta:
+            result['general'] = {
+                'sitename': 'Benchmark', 'generator': 'MediaWiki 1.39.0',
+                'writeapi': '', 'lang': 'zh',
+            }
+            result['namespaces'] = collections.OrderedDict(
+                (str(ns), {'id': ns, '*': name})
+                for ns, name in self.namespaces.items())
+        if 'userinfo' in meta:
+            result['userinfo'] = {
+                'id': 1, 'name': self.username,
+                'groups': ['*', 'user', 'bot'], 'rights': self.rights,
+            }
+        if 'tokens' in meta:
+            result['tokens'] = {'csrftoken': '+\\', 'logintoken': '+\\'}
+
+        response = {'batchcomplete': '', 'query': result}
+        if params.get('list') == 'usercontribs':
+            result['usercontribs'], more = self.contributions(params)
+        elif 'list' in params:
+            name = params['list']
+            items, more = self.listing(name, params, prefix(name))
+            result[name] = [self.item(name, page, params) for page in items]
+        elif 'generator' in params:
+            name = params['generator']
+            pages, more = self.listing(name, params, 'g' + prefix(name))
+            self.properties(result, pages, params)
+        else:
+            more = None
+            self.properties(result, self.page_set(result, params), params)
+        if more:
+            response['continue'] = more
+        return response
+
+    def page_set(self, result, params):
+        'Collect the pages specified by titles, pageids or revids.'
+        pages = []
+        for title in filter(None, params.get('titles', '').split('|')):
+            name = self.normalize(title)
+            if name != title:
+                result.setdefault('normalized', []).append(
+                    {'from': title, 'to': name})
+            if 'redirects' in params and self.pages.get(name, {}).get(
+                    'redirect'):
+                target = self.pages[name]['redirect']
+                result.setdefault('redirects', []).append(
+                    {'from': name, 'to': target})
+                name = target
+            pages.append(self.pages.get(name, {'title': name}))
+        for pageid in filter(None, params.get('pageids', '').split('|')):
+            pages.append(self.page_by_id(pageid))
+        for revid in filter(None, params.get('revids', '').split('|')):
+            rev = self.revisions.get(int(revid))
+            if rev:
+                pages.append(dict(rev['page'], revid=rev['revid']))
+        return pages
+
+    def page_by_id(self, pageid):
+        'Find a page by its id.'
+        for page in self.pages.values():
+            if page['pageid'] == int(pageid):
+                return page
+        return {'pageid': int(pageid), 'missing': ''}
+
+    def listing(self, name, params, p):
+        'Run a list module, returning a slice of the pages and the cursor.'
+        title = self.normalize(params.get(p + 'title', 'API'))
+        if name == 'embeddedin':
+            pages = [x for x in self.pages.values() if title in x['templates']]
+        elif name == 'backlinks':
+            pages = [x for x in self.pages.values() if x['redirect'] == title]
+        elif name == 'search':
+            pages = self.search(params[p + 'search'])
+        else:
+            pages = []
+
+        namespaces = params.get(p + 'namespace')
+        if namespaces:
+            namespaces = set(map(int, str(namespaces).split('|')))
+            pages = [x for x in pages if x['ns'] in namespaces]
+        redirects = params.get(p + 'filterredir', 'all')
+        if redirects != 'all':
+            keep = redirects == 'redirects'
+            pages = [x for x in pages if bool(x['redirect']) == keep]
+
+        limit = params.get(p + 'limit', '10')
+        limit = 500 if limit == 'max' else int(limit)
+        offset = int(params.get(p + 'continue', 0))
+        more = None
+        if offset + limit < len(pages):
+            more = {p + 'continue': str(offset + limit),
+                    'continue': p + '||'}
+        return pages[offset:offset + limit], more
+
+    def contributions(self, params):
+        'List the revisions of a user in a time window, oldest first.'
+        start = digits(params.get('ucstart', ''))
+        end = digits(params.get('ucend', ''))
+        revisions = [
+            rev for rev in self.revisions.values()
+            if rev['user'] == params['ucuser']
+            and (not start or digits(rev['timestamp']) >= start)
+            and (not end or digits(rev['timestamp']) <= end)
+            and ('top' not in params.get('ucshow', '')
+                 or rev is rev['page']['revisions'][-1])
+        ]
+        # continue from a revision rather than an offset, like MediaWiki,
+        # so that the revisions no longer on top do not shift the cursor
+        cursor = int(params.get('uccontinue', '0|0').rpartition('|')[2])
+        revisions = [rev for rev in revisions if rev['revid'] >= cursor]
+        limit = params.get('uclimit', '10')
+        limit = 500 if limit == 'max' else int(limit)
+        more = None
+        if limit < len(revisions):
+            rev = revisions[limit]
+            more = {'uccontinue': '%s|%d' % (rev['timestamp'], rev['revid']),
+                    'continue': '-||'}
+        items, prop = [], {'rvprop': 'ids|timestamp|comment'}
+        for rev in revisions[:limit]:
+            page = rev['page']
+            item = {'pageid': page['pageid'], 'ns': page['ns'],
+                    'title': page['title']}
+            item.update(self.revision(rev, prop))
+            if rev is page['revisions'][-1]:
+                item['top'] = ''
+            items.append(item)
+        return items, more
+
+    def search(self, query):
+        'Support insource searches by strings and regular expressions.'
+        match = re.fullmatch(r'insource:(?:"(.*)"|/(.*)/)', query)
+        if not match:
+            return []
+        plain, regex = match.groups()
+        return [
+            x for x in self.pages.values()
+            if (plain is not None and plain in x['revisions'][-1]['text'])
+            or (regex is not None and re.search(
+                regex, x['revisions'][-1]['text']))
+        ]
+
+    def item(self, name, page, params):
+        'Format an item of a list.'
+        item = {'pageid': page['pageid'], 'ns': page['ns'],
+                'title': page['title']}
+        if name == 'search':
+            item['snippet'] = page['revisions'][-1]['text'][:100]
+        return item
+
+    def properties(self, result, pages, params):
+        'Fill in the page properties.'
+        prop = params.get('prop', '').split('|')
+        result['pages'] = collections.OrderedDict()
+        for i, page in enumerate(pages):
+            if 'revisions' not in page:  # missing pages
+                info = {'ns': self.namespace(page['title'].partition(':')[0])
+                        if ':' in page.get('title', '') else 0,
+                        'missing': ''}
+                if 'title' in page:
+                    info['title'] = page['title']
+                result['pages'][str(-1 - i)] = info
+                continue
+            latest = page['revisions'][-1]
+            info = {'pageid': page['pageid'], 'ns': page['ns'],
+                    'title': page['title']}
+            if 'info' in prop:
+                info.update(
+                    lastrevid=latest['revid'], length=len(latest['text']),
+                    touched=latest['timestamp'], protection=[],
+                )
+                if page['redirect']:
+                    info['redirect'] = ''
+            if 'revisions' in prop:
+                rev = self.revisions[page.get('revid', latest['revid'])]
+                info['revisions'] = [self.revision(rev, params)]
+            result['pages'][str(page['pageid'])] = info
+
+    @staticmethod
+    def revision(rev, params):
+        'Format a revision.'
+        rvprop = params.get('rvprop', 'ids|timestamp|flags|comment|user')
+        data = {}
+        for key in 'revid', 'parentid', 'timestamp', 'user', 'comment':
+            if key in rvprop or key.endswith('id') and 'ids' in rvprop:
+                data[key] = rev[key]
+        if 'content' in rvprop:
+            if params.get('rvslots'):
+                data['slots'] = {'main': {'*': rev['text']}}
+            else:
+                data['*'] = rev['text']
+        return data
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        'Count the connections, to check that they are kept alive.'
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        'Serve the query string parameters.'
+        query = urllib.parse.urlsplit(self.path).query
+        self.respond(urllib.parse.parse_qs(query))
+
+    def do_POST(self):
+        'Serve the form parameters.'
+        length = int(self.headers.get('Content-Length', 0))
+        form = self.rfile.read(length).decode('utf-8')
+        self.respond(urllib.parse.parse_qs(form))
+
+    def respond(self, params):
+        'Call the fake wiki and send its JSON response.'
+        params = {k: v[-1] for k, v in params.items()}
+        body = json.dumps(self.server.wiki(params)).encode('utf-8')
+        encoding = self.headers.get('Accept-Encoding', '')
+        encoding = next((i for i in ('gzip', 'deflate') if i in encoding), '')
+        if encoding == 'gzip':
+            body = gzip.compress(body, 1)
+        elif encoding == 'deflate':
+            body = zlib.compress(body, 1)
+        self.server.wiki.bytes += len(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        'Keep quiet.'
+
+
+class FakeAPI(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, wiki, port=0):
+        'Listen on localhost; a free port is chosen if not specified.'
+        super().__init__(('127.0.0.1', port), Handler)
+        self.wiki = wiki
+        self.connections = 0
+
+    @property
+    def host(self):
+        'The host name for mwclient, with the port number.'
+        return '%s:%d' % self.server_address
+
+    def start(self):
+        'Serve in a background thread.'
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def prefix(list_name):
+    'Get the parameter prefix of a list module.'
+    return {'embeddedin': 'ei', 'backlinks': 'bl', 'search': 'sr'}.get(
+        list_name, list_name[:2])
+
+
+def code(i, length):
+    'Generate a unique code in capital letters, such as an IATA code.'
+    letters = []
+    for _ in range(length):
+        i, r = divmod(i, 26)
+        letters.append(string.ascii_uppercase[r])
+    return ''.join(reversed(letters))
+
+
+def timestamp(seconds):
+    'Format UNIX time as a MediaWiki timestamp.'
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+def digits(timestamp):
+    'Make timestamps in both ISO 8601 and MediaWiki formats comparable.'
+    return re.sub(r'\D', '', timestamp)
+
+
+def error(code, info):
+    'Format an API error.'
+    return {'error': {'code': code, 'info': info}}
+
+
+if __name__ == '__main__':
+    try:
+        argv = sys.argv[1:] + [None] * 3
+        pages, latency, port = argv[:3]
+        wiki = FakeWiki(int(pages or 1000), float(latency or 0))
+        server = FakeAPI(wiki, int(port or 0))
+        print('Serving %d pages at http://%s/w/api.php' % (
+            len(wiki.pages), server.host))
+        server.serve_forever()
+    except ValueError:
+        print(__doc__.format(sys.argv[0]))
+    except KeyboardInterrupt:
+        print(dict(wiki.calls))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+'''Journal of the edits and moves made by the bots.
+
+Every action is appended with the run of the bot that made it, so that
+a run, or all the runs of a job, can be undone without looking up the
+history of the pages.
+
+Usage: {0} [journal.sqlite3] [runs]
+Example: {0} 20
+'''
+
+import sys
+import json
+import time
+import threading
+import collections
+import state
+
+Action = collections.namedtuple('Action', [
+    'id', 'run', 'action', 'pageid', 'title', 'target', 'old_revid',
+    'new_revid', 'summary', 'time',
+])
+
+
+class Journal:
+
+    path = 'journal.sqlite3'
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            job TEXT NOT NULL,
+            started REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS actions (
+            id INTEGER PRIMARY KEY,
+            run INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            pageid INTEGER,
+            title TEXT NOT NULL,
+            target TEXT,
+            old_revid INTEGER,
+            new_revid INTEGER,
+            summary TEXT,
+            time REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_job ON runs (job);
+        CREATE INDEX IF NOT EXISTS actions_run ON actions (run);
+        CREATE INDEX IF NOT EXISTS actions_pageid ON actions (pageid);
+    '''
+
+    def __init__(self, path=None):
+        'Open the journal, outside of any run.'
+        self.lock = threading.RLock()
+        self.db = state.connect(self.path, self.schema, path, wal=True)
+        self.run = None  # nothing is recorded outside of a run
+
+    def start(self, job):
+        'Begin a new run of the job.'
+        job = json.dumps(job, ensure_ascii=False)
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (job, started) VALUES (?, ?)',
+                (job, time.time()))
+        self.run = cursor.lastrowid
+        return self.run
+
+    def record(self, action, title, pageid=None, old_revid=None,
+               new_revid=None, summary=None, target=None):
+        'Append an action of the current run.'
+        if self.run is None:
+            return
+        with self.lock, self.db:
+            self.db.execute('''
+                INSERT INTO actions (
+                    run, action, pageid, title, target, old_revid,
+                    new_revid, summary, time
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (self.run, action, pageid, title, target, old_revid,
+                  new_revid, summary, time.time()))
+
+    def runs(self, spec):
+        'Resolve "run:<id>", or "job:<id>" for all the runs of that job.'
+        kind, _, run = spec.partition(':')
+        if kind == 'run':
+            return [int(run)]
+        with self.lock:
+            rows = self.db.execute('''
+                SELECT id FROM runs WHERE job = (
+                    SELECT job FROM runs WHERE id = ?
+                ) ORDER BY id
+            ''', (int(run),)).fetchall()
+        return [i for i, in rows]
+
+    def actions(self, runs):
+        'List the actions of the runs, in order.'
+        marks = ', '.join('?' * len(runs))
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT * FROM actions WHERE run IN (%s) ORDER BY id' % marks,
+                list(runs)).fetchall()
+        return [Action(*row) for row in rows]
+
+    def undos(self, runs):
+        'Group the actions into the edits of each page, and the moves.'
+        edits = collections.OrderedDict()
+        created, moves = [], []
+        for action in self.actions(runs):
+            if action.action == 'move':
+                moves.append(action)
+            elif action.pageid in edits:  # undo a range of revisions
+                edits[action.pageid] = edits[action.pageid]._replace(
+                    new_revid=action.new_revid)
+            else:
+                edits[action.pageid] = action
+        for pageid, action in list(edits.items()):
+            if not action.old_revid:  # the creation of the page
+                created.append(edits.pop(pageid))
+        return list(edits.values()), created, moves[::-1]
+
+    def history(self, limit=10):
+        'List the latest runs with their numbers of actions.'
+        with self.lock:
+            return self.db.execute('''
+                SELECT runs.id, runs.started, runs.job, count(actions.id)
+                FROM runs LEFT JOIN actions ON actions.run = runs.id
+                GROUP BY runs.id ORDER BY runs.id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+
+
+def main(argv=sys.argv):
+    'Show the latest runs.'
+    args = argv[1:]
+    path = args.pop(0) if args and args[0].endswith('.sqlite3') else None
+    if args and not args[0].isdigit():
+        print(__doc__.format(argv[0]))
+        return
+    journal = Journal(path)
+    for run, started, job, count in journal.history(*map(int, args[:1])):
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))
+        print(run, started, count, ' '.join(json.loads(job)), sep='\t')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+'''Aho-Corasick automaton to find many keywords in a single pass.'''
+
+import collections
+
+
+class Automaton:
+
+    def __init__(self, keywords):
+        'Build the trie of the keywords and link its failure transitions.'
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for keyword in keywords:
+            self._insert(keyword)
+
+        # breadth-first, so that the failure states are always ready
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                fallback = self.goto[fallback].get(char, 0)
+                self.fail[child] = fallback if fallback != child else 0
+                self.output[child] += self.output[self.fail[child]]
+
+    def _insert(self, keyword):
+        'Add a keyword to the trie.'
+        state = 0
+        for char in keyword:
+            child = self.goto[state].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][char] = child
+            state = child
+        if keyword and keyword not in self.output[state]:
+            self.output[state] += (keyword,)
+
+    def _scan(self, text):
+        'Yield the keywords ending at each position of the text.'
+        goto, fail, output = self.goto, self.fail, self.output
+        root = goto[0]
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0) if state else root.get(char, 0)
+            if output[state]:
+                yield output[state]
+
+    def search(self, text):
+        'Return the first keyword found in the text, or None.'
+        for keywords in self._scan(text):
+            return keywords[0]
+        return None
+
+    def findall(self, text):
+        'Return the set of all keywords found in the text.'
+        found = set()
+        for keywords in self._scan(text):
+            found.update(keywords)
+        return found
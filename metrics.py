@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+'''Instrumentation of the bots.
+
+The time spent in each phase (listing, fetching wikitext, conversions,
+substitutions, diffs and saves) is recorded in latency histograms, as
+well as API requests by action, bytes transferred, retries and the use
+of the connection pool. Besides the summary printed at the end, a
+snapshot may be written to a JSON or Prometheus textfile (*.prom)
+periodically during long runs.
+'''
+
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+import contextlib
+import collections
+import urllib.parse
+
+BUCKETS = 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+
+
+class Histogram:
+
+    def __init__(self):
+        'Count the observations falling into each bucket.'
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        'Record an observation.'
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        'Estimate a quantile by the upper bound of its bucket.'
+        rank = q * self.count
+        for bound, total in zip(BUCKETS, self.cumulative()):
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        'Count the observations less than or equal to each bound.'
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class Metrics:
+
+    path = None  # no snapshots by default
+    interval = 60  # seconds between snapshots
+
+    def __init__(self):
+        'Start with empty records.'
+        self.lock = threading.Lock()
+        self.phases = collections.OrderedDict()
+        self.requests = collections.Counter()
+        self.bytes = collections.Counter()
+        self.retries = 0
+        self.gauges = collections.OrderedDict()
+        self.writer = None
+
+    def configure(self, path=None, interval=None):
+        'Write snapshots to the path on an interval.'
+        self.path = path or self.path
+        self.interval = interval or self.interval
+        if self.path and self.writer is None:
+            self.writer = threading.Thread(target=self._write, daemon=True)
+            self.writer.start()
+
+    def watch(self, site):
+        'Count the API requests of the site, and their sizes.'
+        site.connection.hooks['response'].append(self.observe)
+
+    def observe(self, response, *args, **kwargs):
+        'Record an API response.'
+        request = response.request
+        body = request.body or ''
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        query = urllib.parse.urlsplit(request.url).query
+        params = urllib.parse.parse_qs('&'.join((query, body)))
+        action = params.get('action', ['?'])[0]
+        with self.lock:
+            self.requests[action] += 1
+            self.bytes['sent'] += len(body)
+            self.bytes['received'] += len(response.content)
+        self.record('api', response.elapsed.total_seconds())
+
+    def gauge(self, name, func):
+        'Report the current values counted by the function, e.g. of a pool.'
+        self.gauges[name] = func
+
+    def record(self, phase, seconds):
+        'Add the time of a phase to its histogram.'
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = Histogram()
+            self.phases[phase].observe(seconds)
+
+    def retried(self):
+        'Count a failed write which is to be retried.'
+        with self.lock:
+            self.retries += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        'Time the code in the block.'
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self):
+        'Describe the records in a few lines.'
+        lines = ['{0:<10} {1:>8} {2:>10} {3:>10} {4:>10}'.format(
+            'phase', 'count', 'total s', 'mean ms', 'p95 ms')]
+        with self.lock:
+            for name, h in self.phases.items():
+                lines.append('{0:<10} {1:>8} {2:>10.2f} {3:>10.1f} {4:>10}'
+                             .format(name, h.count, h.sum,
+                                     h.sum / h.count * 1000,
+                                     h.quantile(0.95) * 1000))
+            requests = ', '.join(
+                '%d %s' % (n, action) for action, n in self.requests.items())
+            lines.append(
+                'requests: {0}; {1:.1f} KiB sent, {2:.1f} KiB received; '
+                '{3} retries'.format(
+                    requests or 'none', self.bytes['sent'] / 1024,
+                    self.bytes['received'] / 1024, self.retries))
+            for name, func in self.gauges.items():
+                lines.append('%s: %s' % (name, ', '.join(
+                    '%s %s' % (n, key) for key, n in func().items())))
+        return '\n'.join(lines)
+
+    def snapshot(self):
+        'Write the records to the file, atomically.'
+        if not self.path:
+            return
+        with self.lock:
+            if self.path.endswith('.prom'):
+                data = self._prometheus()
+            else:
+                data = json.dumps(self._json(), indent=2) + '\n'
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as fp:
+            fp.write(data)
+        os.replace(temp, self.path)
+
+    def _write(self):
+        'Write snapshots until the process exits.'
+        while True:
+            time.sleep(self.interval)
+            self.snapshot()
+
+    def _json(self):
+        'Arrange the records as JSON.'
+        return dict(
+            time=time.time(),
+            phases={
+                name: dict(count=h.count, sum=h.sum, buckets=dict(zip(
+                    map(str, BUCKETS + ('+Inf',)), h.cumulative())))
+                for name, h in self.phases.items()},
+            requests=self.requests,
+            bytes=self.bytes,
+            retries=self.retries,
+            gauges={name: func() for name, func in self.gauges.items()},
+        )
+
+    def _prometheus(self):
+        'Arrange the records in the Prometheus text format.'
+        lines = ['# TYPE wikibot_phase_seconds histogram']
+        for name, h in self.phases.items():
+            bounds = map(str, BUCKETS + ('+Inf',))
+            for bound, total in zip(bounds, h.cumulative()):
+                lines.append('wikibot_phase_seconds_bucket'
+                             '{phase="%s",le="%s"} %d' % (name, bound, total))
+            lines.append('wikibot_phase_seconds_sum{phase="%s"} %f'
+                         % (name, h.sum))
+            lines.append('wikibot_phase_seconds_count{phase="%s"} %d'
+                         % (name, h.count))
+        lines.append('# TYPE wikibot_requests_total counter')
+        for action, n in self.requests.items():
+            lines.append('wikibot_requests_total{action="%s"} %d'
+                         % (action, n))
+        lines.append('# TYPE wikibot_bytes_total counter')
+        for direction, n in self.bytes.items():
+            lines.append('wikibot_bytes_total{direction="%s"} %d'
+                         % (direction, n))
+        lines.append('# TYPE wikibot_retries_total counter')
+        lines.append('wikibot_retries_total %d' % self.retries)
+        for name, func in self.gauges.items():
+            lines.append('# TYPE wikibot_%s gauge' % name)
+            for key, n in func().items():
+                lines.append('wikibot_%s{stat="%s"} %d' % (name, key, n))
+        return '\n'.join(lines) + '\n'
+
+
+def timed(phase):
+    'Record the time of each call of the function.'
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with default.phase(phase):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+default = Metrics()
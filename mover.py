@@ -7,13 +7,15 @@ Usage: {0} <corrected> <edit-summary> [minor]
 
 import re
 import colorama
-from bot import main
+import metrics
+from bot import Bot, main
 from regex import RegexBot
 
 
 class PageMover(RegexBot):
 
     disambig_pattern = r'(\S+) \((\S+)\S\)'
+    plannable = False  # moves are not queued
 
     def __call__(self, title, edit_summary, minor=False):
         'The main routine.'
@@ -90,14 +92,24 @@ class PageMover(RegexBot):
         self._confirm(page, '{{d|R3|G10}}')
 
     def _save(self, page, result, verbose=False, move=False):
-        'Request a page move.'
+        'Commit changes, or request a page move.'
         if not move:
             return super()._save(page, result, verbose)
+        return self._move(page, result, verbose)
 
+    @Bot._retry
+    @metrics.timed('move')
+    def _move(self, page, result, verbose=False):
+        'Request a page move.'
         if verbose is True:
             print('Moving...', end=' ')
 
-        page.move(result, self.edit_summary)
+        self.site.post(
+            'move', ('from', page.name), to=result, reason=self.edit_summary,
+            movetalk=True, token=page.get_token('move'),
+            **self.scheduler.params)
+        self.journal.record('move', page.name, page.pageid, page.revision,
+                            summary=self.edit_summary, target=result)
 
         if verbose is True:
             print('Done.')
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+'''Queue of the edits proposed with --plan, waiting for review.
+
+The bots which support --plan (regex.py, replace.py, regex_replace.py and
+destain.py) queue their edits instead of asking about each. The pages
+are still proposed one at a time, by a single background thread which
+prepares the next pages while the current one is queued.
+
+Each edit keeps the revision it was based on, the new wikitext and its
+diff, both compressed. The status of an edit goes from pending to
+approved or rejected in the review, then to applied or conflict.
+'''
+
+import time
+import zlib
+import threading
+import collections
+import state
+
+Edit = collections.namedtuple('Edit', [
+    'id', 'title', 'pageid', 'revid', 'timestamp', 'summary', 'minor',
+    'text', 'diff', 'status',
+])
+
+
+class Plan:
+
+    path = 'plan.sqlite3'
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS edits (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            pageid INTEGER NOT NULL,
+            revid INTEGER NOT NULL,
+            timestamp TEXT,
+            summary TEXT NOT NULL,
+            minor INTEGER NOT NULL,
+            text BLOB NOT NULL,
+            diff BLOB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+        );
+        CREATE INDEX IF NOT EXISTS edits_status ON edits (status);
+    '''
+
+    def __init__(self, path=None):
+        'Open the queue of the proposed edits.'
+        self.lock = threading.RLock()
+        self.db = state.connect(self.path, self.schema, path)
+
+    def add(self, page, text, diff, summary, minor=False):
+        'Queue the new wikitext of the page, based on its latest revision.'
+        timestamp = None
+        if getattr(page, 'last_rev_time', None):
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', page.last_rev_time)
+        row = (
+            page.name, page.pageid, page.revision, timestamp, summary,
+            bool(minor), zlib.compress(text.encode('utf-8')),
+            zlib.compress(diff.encode('utf-8')),
+        )
+        with self.lock, self.db:
+            self.db.execute('''
+                INSERT INTO edits (
+                    title, pageid, revid, timestamp, summary, minor,
+                    text, diff
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+
+    def edits(self, status='pending'):
+        'List the edits of the status, in order.'
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT * FROM edits WHERE status = ? ORDER BY id',
+                (status,)).fetchall()
+        for row in rows:
+            row = list(row)
+            for i in 7, 8:
+                row[i] = zlib.decompress(row[i]).decode('utf-8')
+            yield Edit(*row)
+
+    def mark(self, edit, status):
+        'Update the status of an edit.'
+        with self.lock, self.db:
+            self.db.execute(
+                'UPDATE edits SET status = ? WHERE id = ?', (status, edit.id))
+
+    def count(self):
+        'Count the edits by status.'
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT status, count(*) FROM edits GROUP BY status')
+            return collections.OrderedDict(rows.fetchall())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+
+'''Bulk prefetching of page contents for list generators.'''
+
+import json
+import time
+import queue
+import itertools
+import threading
+import collections
+import mwclient
+import metrics
+from mwclient.util import parse_timestamp
+
+
+class PrefetchedPage(mwclient.page.Page):
+
+    store = None
+
+    def __init__(self, site, name, info=None, *args, **kwargs):
+        'Keep the latest revision if it was fetched along with the info.'
+        super().__init__(site, name, info, *args, **kwargs)
+        self._content = None
+        self._load()
+
+    def _load(self):
+        'Take the revision from the page info.'
+        for rev in self._info.get('revisions', ()):
+            slot = rev.get('slots', {}).get('main', rev)
+            self._content = slot.get('*')
+            self.last_rev_time = parse_timestamp(rev['timestamp'])
+            self.edit_time = time.gmtime()
+
+    @metrics.timed('text')
+    def text(self, section=None, expandtemplates=False, cache=True,
+             *args, **kwargs):
+        'Serve the prefetched wikitext, and fetch anything else as usual.'
+        plain = section is None and not expandtemplates and cache
+        if plain and self._content is None and self.store and self.revision:
+            revisions(self.site, [self._info], self.store)
+            self._load()
+        if not plain or self._content is None:
+            return super().text(section, expandtemplates, cache,
+                                *args, **kwargs)
+        return self._content
+
+    def edit(self, text, *args, section=None, **kwargs):
+        'Save the page, keeping the saved wikitext as its latest revision.'
+        result = super().edit(text, *args, section=section, **kwargs)
+        if section is not None:  # only a part of the page is known
+            self._content = None
+        elif 'newrevid' in result:  # not a null edit
+            # not stored, as the pre-save transform may change the text
+            self._content = text
+            self.exists = True
+            self.revision = self._info['lastrevid'] = result['newrevid']
+        return result
+
+
+class PrefetchedPageList(mwclient.listing.PageList):
+
+    def __init__(self, site, store=None, *args, **kwargs):
+        'Create pages which look up the revision store for their contents.'
+        super().__init__(site, *args, **kwargs)
+        self.store = store
+
+    def get(self, name, info=()):
+        'Return the page of the name as an object.'
+        page = super().get(name, info)
+        if type(page) is mwclient.page.Page:
+            page = PrefetchedPage(self.site, page.name, page._info)
+            page.store = self.store
+        return page
+
+
+class PrefetchList:
+
+    info = dict(prop='info', inprop='protection')
+    content = dict(
+        prop='info|revisions', inprop='protection',
+        rvprop='ids|timestamp|content', rvslots='main',
+    )
+
+    def __init__(self, site, list_name, prefix, talk=False, store=None,
+                 checkpoint=None, namespaces=None, redirects=None, **kwargs):
+        'Prepare a generator query, e.g. embeddedin with the "ei" prefix.'
+        self.site = site
+        self.talk = talk
+        self.store = store
+        self.limit = limit(site)
+        self.args = {'generator': list_name}
+        kwargs.update(filters(namespaces, redirects))
+        for key, value in kwargs.items():
+            self.args['g' + prefix + key] = value
+        self.args['g' + prefix + 'limit'] = self.limit
+        self.last = False
+
+        # resume from the batch in progress, skipping the finished pages
+        self.name = json.dumps(self.args, sort_keys=True, ensure_ascii=False)
+        self.continuation, self.done = {}, set()
+        if checkpoint:
+            continuation, self.done = checkpoint.load(self.name)
+            if continuation:
+                self.continuation = continuation
+                self.args.update(continuation)
+
+    def __iter__(self):
+        'Yield the pages batch by batch.'
+        while not self.last:
+            yield from self.load_chunk()
+
+    @metrics.timed('list')
+    def load_chunk(self):
+        'Fetch the next batch of pages.'
+        # fetch the metadata first if the contents may have been stored
+        combined = self.store is None and not self.talk and not self.done
+        args = dict(self.args, **(self.content if combined else self.info))
+        pages, _, continuation = query(self.site, **args)
+        position = self.name, self.continuation
+        if continuation:
+            self.args.update(continuation)
+            self.continuation = continuation
+        else:
+            self.last = True
+        pages = [info for info in pages if info.get('pageid') not in self.done]
+
+        if self.talk:  # attach the contents of their talk pages instead
+            pages = [self._page(info, position) for info in pages]
+            titles = [talk_title(self.site, p) for p in pages]
+            talks = fetch(self.site, filter(None, titles), self.store)
+            for page, title in zip(pages, titles):
+                page.talk = talks.get(title)
+            return pages
+        elif not combined:
+            revisions(self.site, pages, self.store)
+        return [self._page(info, position) for info in pages]
+
+    def _page(self, info, position=None):
+        'Create a page object from its info.'
+        page = PrefetchedPage(self.site, info['title'], info)
+        page.store = self.store
+        page.position = position
+        return page
+
+
+class Lookahead:
+
+    done = object()  # the end of the items
+
+    def __init__(self, func, iterable, size=10):
+        'Prepare up to the given number of items in the background.'
+        self.queue = queue.Queue(size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._work, args=(func, iterable), daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        'Yield the prepared results in order.'
+        while True:
+            value = self.queue.get()
+            if value is self.done:
+                return
+            result, err = value
+            if err is not None:
+                raise err
+            yield result
+
+    def close(self):
+        'Stop preparing, and throw away the prepared work.'
+        self.stopped.set()
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _work(self, func, iterable):
+        'Prepare the items one by one, until the queue is full.'
+        try:
+            for item in iterable:
+                if self.stopped.is_set():
+                    return
+                try:
+                    self._put((func(item), None))
+                except Exception as err:
+                    self._put((None, err))
+        except Exception as err:  # failed to list the items
+            self._put((None, err))
+        finally:  # stop the earlier stages of a pipeline, too
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        self._put(self.done)
+
+    def _put(self, value):
+        'Wait for a free slot, unless stopped.'
+        while not self.stopped.is_set():
+            try:
+                return self.queue.put(value, timeout=0.1)
+            except queue.Full:
+                pass
+
+
+def limit(site):
+    'Contents of up to 500 pages per request are allowed for bots.'
+    return 500 if 'apihighlimits' in site.rights else 50
+
+
+def query(site, **kwargs):
+    'Run a query until its batch is complete.'
+    pages = collections.OrderedDict()
+    normalized = {}
+    while True:
+        data = site.post('query', **kwargs)
+        result = data.get('query', {})
+        for item in result.get('normalized', ()):
+            normalized[item['from']] = item['to']
+        for key, info in result.get('pages', {}).items():
+            if key in pages:  # the revisions were continued
+                pages[key].setdefault('revisions', [])
+                pages[key]['revisions'] += info.get('revisions', [])
+            else:
+                pages[key] = info
+        continuation = data.get('continue')
+        if 'batchcomplete' in data or not continuation:
+            return list(pages.values()), normalized, continuation
+        kwargs.update(continuation)
+
+
+def revisions(site, pages, store=None):
+    'Attach the latest revisions to the page infos, stored ones first.'
+    missing = collections.OrderedDict()
+    for info in pages:
+        revid = info.get('lastrevid')
+        cached = store.get(revid) if store and revid else None
+        if cached:
+            timestamp, text = cached
+            info['revisions'] = [{'revid': revid, 'timestamp': timestamp,
+                                  '*': text}]
+        elif revid:
+            missing[revid] = info
+
+    revids = list(missing)
+    step = limit(site)
+    for i in range(0, len(revids), step):
+        batch = '|'.join(map(str, revids[i:i + step]))
+        result, _, _ = query(
+            site, revids=batch, prop='revisions',
+            rvprop=PrefetchList.content['rvprop'], rvslots='main',
+        )
+        for rev in (r for page in result for r in page.get('revisions', ())):
+            missing[rev['revid']]['revisions'] = [rev]
+            text = rev.get('slots', {}).get('main', rev).get('*')
+            if store and text is not None:
+                store.put(rev['revid'], rev['timestamp'], text)
+
+
+def fetch(site, titles, store=None):
+    'Map the titles to pages with their wikitext, in bulk.'
+    result = collections.OrderedDict()
+    titles = list(titles)
+    step = limit(site)
+    args = PrefetchList.info if store else PrefetchList.content
+    for i in range(0, len(titles), step):
+        batch = titles[i:i + step]
+        pages, normalized, _ = query(site, titles='|'.join(batch), **args)
+        if store:
+            revisions(site, pages, store)
+        pages = {info['title']: info for info in pages}
+        for title in batch:
+            info = pages.get(normalized.get(title, title))
+            if info:
+                result[title] = PrefetchedPage(site, info['title'], info)
+                result[title].store = store
+    return result
+
+
+def candidates(site, titles, store=None):
+    'List the pages of the titles with their wikitext, batch by batch.'
+    titles = iter(titles)
+    while True:
+        batch = list(itertools.islice(titles, limit(site)))
+        if not batch:
+            return
+        yield from fetch(site, batch, store).values()
+
+
+def contributions(site, user, checkpoint=None, **kwargs):
+    'List the contributions of the user batch by batch, with the positions.'
+    args = dict(list='usercontribs', ucuser=user, uclimit=limit(site))
+    for key, value in kwargs.items():
+        args['uc' + key] = value
+    name = json.dumps(args, sort_keys=True, ensure_ascii=False)
+    continuation, done = checkpoint.load(name) if checkpoint else ({}, set())
+    while True:
+        data = site.post('query', **dict(args, **continuation))
+        items = data.get('query', {}).get('usercontribs', [])
+        yield (name, continuation), [
+            item for item in items if item['pageid'] not in done]
+        continuation = data.get('continue')
+        if not continuation:
+            return
+
+
+def filters(namespaces=None, redirects=None):
+    'Translate the filters of a list into its parameters, e.g. namespace.'
+    args = {}
+    if namespaces is not None:
+        args['namespace'] = '|'.join(map(str, sorted(namespaces)))
+    if redirects is not None:
+        args['filterredir'] = 'redirects' if redirects else 'nonredirects'
+    return args
+
+
+def search(site, query, store=None, ahead=2, namespaces=None, **kwargs):
+    'Search the site, fetching the wikitext of the results in bulk.'
+    def results():
+        args = dict(list='search', srsearch=query, srprop='snippet',
+                    srlimit=limit(site))
+        kwargs.update(filters(namespaces))  # no redirects in the results
+        for key, value in kwargs.items():
+            args['sr' + key] = value
+        continuation = {}
+        while True:
+            data = site.post('query', **dict(args, **continuation))
+            yield data.get('query', {}).get('search', [])
+            continuation = data.get('continue')
+            if not continuation:
+                return
+
+    def fetched(items):
+        pages = fetch(site, [item['title'] for item in items], store)
+        for item in items:
+            if item['title'] in pages:
+                pages[item['title']].snippet = item.get('snippet')
+        return pages.values()
+
+    # search the next batch while fetching the current one, and both while
+    # the pages are processed; the bounded queues keep the memory flat
+    with Lookahead(list, results(), ahead) as found, \
+            Lookahead(fetched, found, ahead) as batches:
+        for pages in batches:
+            yield from pages
+
+
+def talk_title(site, page):
+    'Get the title of the talk page, if the page is not one itself.'
+    if page.namespace % 2:
+        return None
+    return '%s:%s' % (site.namespaces[page.namespace + 1], page.page_title)
+
+
+def embeddedin(site, title, talk=False, store=None, checkpoint=None,
+               **kwargs):
+    'List pages transcluding the title, with their wikitext.'
+    return PrefetchList(site, 'embeddedin', 'ei', talk, store, checkpoint,
+                        title=title, **kwargs)
+
+
+def backlinks(site, title, talk=False, store=None, checkpoint=None,
+              **kwargs):
+    'List pages linking to the title, with their wikitext.'
+    return PrefetchList(site, 'backlinks', 'bl', talk, store, checkpoint,
+                        title=title, **kwargs)
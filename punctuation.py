@@ -1,22 +1,21 @@
 #!/usr/bin/env python3
 
 from bot import read_config
+from matcher import Automaton
 from replace import ReplaceBot
 
 
 class PunctuationBot(ReplaceBot):
 
-    def _replace(self, page):
-        blacklist = self.blacklist.split('|')
-        original_text = page.text()
+    def __call__(self, *args, **kwargs):
+        self.rules = Automaton(self.blacklist.split('|'))
+        super().__call__(*args, **kwargs)
 
-        if page.namespace:  # not articles
-            return next(self)
-        elif any(rule in original_text for rule in blacklist):
+    def _replace(self, page, replaced_text, preview=None):
+        if self.rules.search(page.text()):  # blacklisted
             return next(self)
         else:
-            replaced_text = original_text.replace(*self.keywords)
-            self._confirm(page, replaced_text)
+            super()._replace(page, replaced_text, preview)
 
 
 if __name__ == '__main__':
@@ -2,21 +2,20 @@
 
 '''Add telegraph code to China railway station articles.
 
-Usage: {0} <edit-summary> [minor]
+Usage: {0} <edit-summary> [minor] [--resume]
 Example: {0} "Add telegraph code" m
 '''
 
 import re
 import colorama
-import gevent.monkey
-import gevent.pool
-gevent.monkey.patch_all()
+from aiobot import AsyncBot
+from bot import main
+from stations import StationIndex
 
-from bot import Bot, main
 
+class RailwayBot(AsyncBot):
 
-class RailwayBot(Bot):
-
+    cached = True
     template = 'Template:Infobox China railway station'
     keywords = ['电报码', '拼音码']
     repl = '|电报码 = {1}\n|拼音码 = {0}\n'
@@ -30,76 +29,78 @@ class RailwayBot(Bot):
     def __init__(self, *args, **kwargs):
         'Load the telegraph code database.'
         super().__init__(*args, **kwargs)
-        self.pool = gevent.pool.Pool(100)
-
-        # https://kyfw.12306.cn/otn/resources/js/framework/station_name.js
-        with open('station_name.js', encoding='utf-8') as fp:
-            # skip javascript stuff around single quotes
-            # skip the first '@' character in the string
-            packed_stations = fp.read().split("'")[1][1:]
-
-        self.stations = {}
-        for s in packed_stations.split('@'):
-            lst = s.split('|')
-            self.stations[lst[1]] = [lst[0].upper(), lst[2]]
+        self.stations = StationIndex('station_name.js')
 
     def __call__(self, edit_summary, minor=False):
         'Iterate through instances of the railway station template.'
         super().__call__(edit_summary, minor)
         self.unknown = 0
-        pages = self.site.pages[self.template].embeddedin()
-        for page in self.pool.imap(self._evaluate, pages):
+        pages = self._embeddedin(self.template)
+        for page in self._crawl(self._evaluate, pages):
             pass
 
         self._show_stat()
 
-    def _normalize(self, pageid):
-        'Get normalized station name from page id.'
-        simplified = self._convert(pageid=pageid, uselang='zh-CN')
+    def _normalize(self, page):
+        'Get normalized station name of the page.'
+        simplified = self.converter.local(page.name, 'zh-cn')
+        if simplified is not None:
+            match = re.match(self.name_pattern, simplified)
+            if match and match.group(1) in self.stations:
+                return match.group(1)
+
+        # unknown to the local tables, ask for the display title instead
+        simplified = self._convert(pageid=page.pageid, uselang='zh-CN')
         match = re.match(self.name_pattern, simplified)
         return match.group(1) if match else ''
 
     def _evaluate(self, page):
         'Analyze the page contents to decide the next step.'
-        normalized = self._normalize(page.pageid)
-
-        # exclude pages with telecode, but not pages with empty parameters
-        contents = page.text()
-        included = any(
-            keyword in contents
-            for keyword in self.keywords)
-        complete = all(
-            re.search(self.valid_pattern % keyword, contents)
-            for keyword in self.keywords)
+        normalized = self._normalize(page)
 
         # does not perform any action by default
         action = False
 
-        if complete:
+        if self._complete(page.text()):
             prompt = 'OK'
-            self.ignored += 1
+            self._count('ignored')
         elif not normalized:
             prompt = colorama.Fore.RED + 'X'
-            self.errors += 1
+            self._count('errors')
         elif normalized not in self.stations:
             prompt = colorama.Fore.MAGENTA + normalized + '?'
-            self.unknown += 1
+            self._count('unknown')
         else:
-            prompt = colorama.Fore.YELLOW + self.stations[normalized][1]
+            station = self.stations[normalized]
+            prompt = colorama.Fore.YELLOW + station.telecode
             action = True
 
-        self._info(page, ' -> ', prompt, end='')
-
-        if action:
-            self._replace(page, contents, self.stations[normalized], included)
+        if not action:
+            with self.console:
+                self._info(page, ' -> ', prompt, end='')
+            return
+        data = station.pinyin, station.telecode
+        self._commit(page, self._replace, data, prompt,
+                     confirm=True, verbose=False)
+
+    def _complete(self, contents):
+        'Exclude pages with telecode, but not pages with empty parameters.'
+        return all(
+            re.search(self.valid_pattern % keyword, contents)
+            for keyword in self.keywords)
 
-    def _replace(self, page, contents, data, existing=False):
+    def _replace(self, page, data, prompt):
         'Do regular expression substitute and preview the changes.'
+        contents = page.text()
+        if self._complete(contents):  # filled in after an edit conflict
+            return None
+        self._info(page, ' -> ', prompt, end='')
+
         # remove existing parameters
-        s = contents
-        if existing:
+        s, spans = contents, []
+        if any(keyword in contents for keyword in self.keywords):
             fields = '|'.join(self.keywords)
-            s = re.sub(self.field_pattern % fields, '', s)
+            s, spans = self._sub(self.field_pattern % fields, '', s)
 
         # get the last occurrence
         for match in re.finditer(self.field_pattern % self.fields, s):
@@ -107,10 +108,18 @@ class RailwayBot(Bot):
 
         # insert telegraph code after the match
         i = match.end()
-        result = ''.join((s[:i], self.repl.format(*data), s[i:]))
-
-        self._diff(contents, result)
-        self._confirm(page, result, verbose=False)
+        inserted = self.repl.format(*data)
+        result = ''.join((s[:i], inserted, s[i:]))
+
+        # locate the insertion point in the original contents
+        j = i
+        for start, end, repl in spans:
+            if start - (j - i) <= i:
+                j += end - start - len(repl)
+        spans.append((j, j, inserted))
+        spans.sort(key=lambda span: span[:2])
+        self._diff(contents, result, spans)
+        return result
 
 
 if __name__ == '__main__':
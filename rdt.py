@@ -1,24 +1,90 @@
 #!/usr/bin/env python3
 
 '''Convert route diagram templates from {{BS-table}} to {{Routemap}}.
+
+Many diagrams may be converted at once, from files (each written to
+<file>.routemap) or from a stream of JSON lines with a "text" field. The
+diagrams are split into fragments, and the fragments not transformed
+before are packed into a few pre-save transform requests.
+
+Usage: {0} < diagram.txt
+       {0} <files>...
+       {0} --jsonl < diagrams.jsonl > routemaps.jsonl
 '''
 
 import re
 import sys
-from bot import Bot
+import json
+import uuid
+import hashlib
+import state
+from bot import Bot, read_config
+
+
+class PSTCache:
+
+    path = 'pst.sqlite3'
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS pst (
+            sha1 TEXT PRIMARY KEY,
+            result TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, path=None):
+        'Open the cache of the transformed fragments.'
+        self.db = state.connect(self.path, self.schema, path)
+
+    def get(self, key):
+        'Look up the transformed fragment.'
+        row = self.db.execute(
+            'SELECT result FROM pst WHERE sha1 = ?', (digest(key),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, items):
+        'Keep the transformed fragments.'
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO pst VALUES (?, ?)',
+                ((digest(key), value) for key, value in items))
 
 
 class RDTConverter(Bot):
 
-    def __init__(self):
-        'Use English Wikipedia to substitute the templates.'
-        super().__init__('en.wikipedia.org')
+    host = 'en.wikipedia.org'
+    batch_size = 500  # fragments per request
+    batch_bytes = 100000
+
+    # the blocks left alone by the pre-save transform, and the braces
+    token_pattern = r'(?i)<!--|-->|<(/?)(nowiki|pre)\b[^>]*>|[{}]'
+
+    def __init__(self, cache=None, batch_size=None, batch_bytes=None,
+                 site=None):
+        'Use English Wikipedia, or the site, to substitute the templates.'
+        if site is None:
+            super().__init__(self.host)
+        else:  # already signed in
+            self.site = site
+        self.cache = cache if isinstance(cache, PSTCache) else PSTCache(cache)
+        self.batch_size = batch_size or self.batch_size
+        self.batch_bytes = batch_bytes or self.batch_bytes
 
     def __call__(self, wikitext: str) -> str:
         'Perform the conversions.'
-        wikitext = self._add_safesubst(wikitext)
-        result = self._parse_pst(wikitext).strip()
+        return self.convert([wikitext])[0]
 
+    def convert(self, texts):
+        'Convert many diagrams, sharing the requests and the cache.'
+        texts = [self._fragments(self._add_safesubst(t)) for t in texts]
+        results = self._expand(f for fragments in texts for f in fragments)
+        return [
+            self._wrap('\n'.join(results[f] for f in fragments).strip())
+            for fragments in texts]
+
+    @staticmethod
+    def _wrap(result: str) -> str:
+        'Complete the {{Routemap}} template.'
         if not result.startswith('{{'):
             result = '{{Routemap|map=\n' + result
         if not result.endswith('}}'):
@@ -37,6 +103,74 @@ class RDTConverter(Bot):
         repl = r'\1{0}:\2/{0}\3'.format('safesubst')
         return re.sub(pattern, repl, wikitext)
 
+    @classmethod
+    def _fragments(cls, wikitext: str) -> list:
+        'Split the wikitext into lines, keeping multi-line blocks whole.'
+        fragments, lines, depth, closing = [], [], 0, None
+        for line in wikitext.split('\n'):
+            lines.append(line)
+            for match in re.finditer(cls.token_pattern, line):
+                token = match.group().lower()
+                if closing:  # in a comment, nowiki or pre block
+                    if token.startswith(closing):
+                        closing = None
+                elif token == '<!--':
+                    closing = '-->'
+                elif match.group(2) and not match.group(1) \
+                        and not token.endswith('/>'):
+                    closing = '</' + match.group(2).lower()
+                elif token in '{}':
+                    depth += 1 if token == '{' else -1
+            if depth <= 0 and not closing:
+                fragments.append('\n'.join(lines))
+                lines, depth = [], 0
+        if lines:
+            fragments.append('\n'.join(lines))
+        return fragments
+
+    def _expand(self, fragments) -> dict:
+        'Transform each distinct fragment once, from the cache if possible.'
+        results, missing = {}, []
+        for fragment in fragments:
+            if fragment in results:
+                continue
+            elif not re.search(r'\{\{|\[\[|~~~', fragment):  # nothing to do
+                results[fragment] = fragment
+            else:
+                results[fragment] = self.cache.get(fragment)
+                if results[fragment] is None:
+                    missing.append(fragment)
+
+        for batch in self._batches(missing):
+            transformed = list(zip(batch, self._parse_batch(batch)))
+            results.update(transformed)
+            self.cache.put(transformed)
+        return results
+
+    def _batches(self, fragments):
+        'Pack the fragments into requests of limited sizes.'
+        batch, size = [], 0
+        for fragment in fragments:
+            if batch and (len(batch) >= self.batch_size
+                          or size + len(fragment) > self.batch_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(fragment)
+            size += len(fragment)
+        if batch:
+            yield batch
+
+    def _parse_batch(self, batch: list) -> list:
+        'Transform the fragments in a single request, between separators.'
+        separator = '<!--%s-->' % uuid.uuid4().hex
+        wikitext = '\n'.join([separator] + [
+            '%s\n%s' % (fragment, separator) for fragment in batch])
+        pieces = re.split(
+            r'\n?%s\n?' % separator, self._parse_pst(wikitext))[1:-1]
+        if len(pieces) != len(batch):  # mangled separators, one at a time
+            return [self._parse_pst(fragment) for fragment in batch]
+        return pieces
+
     def _parse_pst(self, wikitext: str) -> str:
         'Do a pre-save transform on the input.'
         api = 'parse'
@@ -46,6 +180,33 @@ class RDTConverter(Bot):
         )[api]['text']['*']
 
 
+def digest(text):
+    'Address a fragment by its SHA-1 digest.'
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def main(argv=sys.argv):
+    'Convert the standard input, the files or the JSON lines.'
+    args = argv[1:]
+    bot = RDTConverter(**read_config('bot.ini', 'rdt'))
+    if not args:
+        print('\n', bot(sys.stdin.read()))
+    elif args == ['--jsonl']:
+        items = [json.loads(line) for line in sys.stdin if line.strip()]
+        results = bot.convert(item['text'] for item in items)
+        for item, result in zip(items, results):
+            item['result'] = result
+            print(json.dumps(item, ensure_ascii=False))
+    else:
+        texts = []
+        for path in args:
+            with open(path, encoding='utf-8') as fp:
+                texts.append(fp.read())
+        for path, result in zip(args, bot.convert(texts)):
+            with open(path + '.routemap', 'w', encoding='utf-8') as fp:
+                fp.write(result + '\n')
+            print(path, '->', path + '.routemap')
+
+
 if __name__ == '__main__':
-    bot = RDTConverter()
-    print('\n', bot(sys.stdin.read()))
+    main()
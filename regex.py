@@ -2,15 +2,24 @@
 
 '''Regular expression substitution bot.
 
-Usage: {0} <templates> <pattern> <repl> <edit-summary> [minor]
+Usage: {0} <templates> <pattern> <repl> <edit-summary> [minor] [--plan]
 '''
 
-import re
-from bot import Bot, main
+from bot import Bot, main, read_config
+from compute import Compute
 
 
 class RegexBot(Bot):
 
+    namespaces = {0, 10}  # only articles and templates
+    cached = True
+    plannable = True
+
+    def __init__(self, *args, **kwargs):
+        'Prepare the stage for the substitutions.'
+        super().__init__(*args, **kwargs)
+        self.compute = Compute(**read_config('bot.ini', 'compute'))
+
     def __call__(self, template, pattern, repl, edit_summary, minor=False):
         'Iterate through pages transcluding from the template.'
         super().__call__(edit_summary, minor)
@@ -18,25 +27,48 @@ class RegexBot(Bot):
         self.repl = repl
 
         ns = 'Template:'
-        for page in self.site.pages[ns + template].embeddedin():
-            self._evaluate(page)
+        pages = self._candidates(pattern, self.namespaces)
+        pages = pages or self._embeddedin(
+            ns + template, namespaces=self.namespaces)
+        self._substitute(pages)
 
         self._show_stat()
 
-    def _evaluate(self, page):
+    def _substitute(self, pages):
+        'Substitute in the pages ahead, then evaluate them one by one.'
+        items = self.compute.imap(self.pattern, self.repl, pages)
+        with self._lookahead(self._propose, items) as proposals:
+            for page, computed, preview in proposals:
+                self._evaluate(page, computed, preview)
+
+    def _propose(self, item):
+        'Render the diff of a substituted page in advance.'
+        page, computed = item
+        preview = None
+        if computed and computed[1]:
+            preview = self._render(
+                page.text(), *computed, color=self.plan is None)
+        return page, computed, preview
+
+    def _evaluate(self, page, computed=None, preview=None):
         'Analyze the page contents to decide the next step.'
-        if page.namespace in [0, 10]:  # only articles and templates
-            contents = page.text()
-            if re.search(self.pattern, contents):
-                return self._replace(page, contents)
+        contents = page.text()
+        result, spans = computed or self._sub(
+            self.pattern, self.repl, contents)
+        if spans:
+            return self._replace(page, contents, result, spans, preview)
 
         return next(self)
 
-    def _replace(self, page, contents):
-        'Do regular expression substitute and preview the changes.'
+    def _replace(self, page, contents, result, spans, preview=None):
+        'Preview the changes of the substitution.'
+        if self.plan is not None:
+            return self._queue(page, result, preview, spans)
         self._info(page)
-        result = re.sub(self.pattern, self.repl, contents)
-        self._diff(contents, result)
+        if preview is None:
+            self._diff(contents, result, spans)
+        else:
+            print(preview)
         self._confirm(page, result)
 
 
@@ -2,12 +2,11 @@
 
 r'''Regular expression substitution bot.
 
-Usage: {0} <pattern> <repl> <edit-summary> [minor]
+Usage: {0} <pattern> <repl> <edit-summary> [minor] [--plan]
 Example: {0} "\(([A-Z a-z-]+)）" "（\1）" "Fix parentheses"
 Example: {0} "（([A-Z a-z-]+)\)" "（\1）" "Fix parentheses"
 '''
 
-import re
 from bot import Bot, main
 from replace import ReplaceBot
 from regex import RegexBot
@@ -21,16 +20,30 @@ class RegexReplaceBot(RegexBot, ReplaceBot):
         self.pattern = pattern
         self.repl = repl
 
-        for item in self.site.search('insource:/%s/' % pattern):
-            page = self._parse(item)
-            self._evaluate(page)
+        pages = self._candidates(pattern, {0})
+        if pages is None:  # search the site instead
+            pages = self._search('insource:/%s/' % pattern, {0})
+        self._substitute(pages)
 
         self._show_stat()
 
-    def _replace(self, page, contents):
-        'Do regular expression substitute and preview the changes.'
-        result = re.sub(self.pattern, self.repl, contents)
-        if self.minor:  # automatic mode
+    def _propose(self, item):
+        'Nothing to render, the changes are not previewed unless planned.'
+        if self.plan is not None:
+            return super()._propose(item)
+        return item + (None,)
+
+    def _evaluate(self, page, computed=None, preview=None):
+        'Show the search result before analyzing it.'
+        if self.plan is None:
+            self._parse(page)
+        return super()._evaluate(page, computed, preview)
+
+    def _replace(self, page, contents, result, spans, preview=None):
+        'Commit the substitution, or preview it in manual mode.'
+        if self.plan is not None:  # queue it for the review instead
+            self._queue(page, result, preview, spans)
+        elif self.minor:  # automatic mode
             self._save(page, result)
         else:  # manual mode
             self._confirm(page, result)
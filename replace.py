@@ -2,45 +2,72 @@
 
 '''Simple find-and-replace bot.
 
-Usage: {0} <pattern> <repl> <edit-summary> [minor]
+Usage: {0} <pattern> <repl> <edit-summary> [minor] [--plan]
 Example: {0} infomation information "Fix typo" m
 '''
 
+import re
 import html
 import colorama
+import prefetch
 from bot import Bot, main
 
 
 class ReplaceBot(Bot):
 
+    cached = True
+    plannable = True
+
     def __call__(self, pattern, repl, edit_summary, minor=False):
         'Search the MediaWiki site.'
         super().__call__(edit_summary, minor)
         self.keywords = [pattern, repl]
 
-        for item in self.site.search('insource:"%s"' % pattern):
-            page = self._parse(item)
-            self._replace(page)
+        pages = self._candidates(re.escape(pattern), {0})
+        if pages is None:  # search the site instead
+            pages = self._search('insource:"%s"' % pattern, {0})
+        with self._lookahead(self._propose, pages) as proposals:
+            for page, replaced_text, preview in proposals:
+                if self.plan is not None:  # queue it for the review
+                    self._queue(page, replaced_text, preview)
+                    continue
+                self._parse(page)
+                self._replace(page, replaced_text, preview)
 
         self._show_stat()
 
-    def _parse(self, item):
+    def _search(self, query, namespaces=None):
+        'List the pages found with their wikitext and search snippets.'
+        return prefetch.search(
+            self.site, query, self.store, namespaces=namespaces)
+
+    def _parse(self, page):
         'Highlight keywords in the article.'
-        page = self.site.pages[item['title']]
         self._info(page)
-        print(html.unescape(
-            item['snippet']
-            .replace('<span class="searchmatch">', colorama.Fore.MAGENTA)
-            .replace('</span>', colorama.Fore.RESET)
-        ))
-        return page
-
-    def _replace(self, page):
-        'Performs the replacement and preview the changes.'
+        snippet = getattr(page, 'snippet', None)
+        if snippet:  # not for the pages found in the dump
+            print(html.unescape(
+                snippet
+                .replace('<span class="searchmatch">', colorama.Fore.MAGENTA)
+                .replace('</span>', colorama.Fore.RESET)
+            ))
+
+    def _propose(self, page):
+        'Performs the replacement and render the diff in advance.'
         original_text = page.text()
-        replaced_text = original_text.replace(*self.keywords)
-        if not self.minor:
-            self._diff(original_text, replaced_text)
+        replaced_text, spans = self._str_replace(original_text, *self.keywords)
+        preview = None
+        if self.plan is not None:
+            preview = self._render(
+                original_text, replaced_text, spans, color=False)
+        elif not self.minor:
+            preview = self._render(original_text, replaced_text, spans)
+        return page, replaced_text, preview
+
+    def _replace(self, page, replaced_text, preview=None):
+        'Preview the changes and confirm them.'
+        if preview:
+            print(preview)
         self._confirm(page, replaced_text)
 
 
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+'''Persistent on-disk store of page revisions.
+
+The contents are compressed and addressed by their SHA-1 digests, so
+identical revisions (e.g. reverts) share the same storage. When the
+store grows beyond its size limit, the least recently used contents
+are evicted.
+'''
+
+import hashlib
+import threading
+import time
+import zlib
+import state
+
+
+class RevisionStore:
+
+    path = 'revisions.sqlite3'
+    max_size = 1 << 30  # bytes of compressed contents
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS revisions (
+            revid INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            sha1 TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS contents (
+            sha1 TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS revisions_sha1 ON revisions (sha1);
+        CREATE INDEX IF NOT EXISTS contents_used ON contents (used);
+    '''
+
+    def __init__(self, path=None, max_size=None):
+        'Open the store, and measure the contents kept so far.'
+        self.max_size = max_size or self.max_size
+        self.lock = threading.RLock()
+        self.db = state.connect(self.path, self.schema, path)
+        query = 'SELECT total(size) FROM contents'
+        self.size = int(self.db.execute(query).fetchone()[0])
+        self.hits = self.misses = 0
+
+    def get(self, revid):
+        'Get the timestamp and the wikitext of a revision, or None.'
+        query = '''
+            SELECT timestamp, contents.sha1, data FROM revisions
+            JOIN contents ON revisions.sha1 = contents.sha1
+            WHERE revid = ?
+        '''
+        with self.lock:
+            row = self.db.execute(query, (revid,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            timestamp, sha1, data = row
+            query = 'UPDATE contents SET used = ? WHERE sha1 = ?'
+            with self.db:
+                self.db.execute(query, (time.time(), sha1))
+        return timestamp, zlib.decompress(data).decode('utf-8')
+
+    def put(self, revid, timestamp, text):
+        'Save a revision, then evict old contents if the store is full.'
+        raw = text.encode('utf-8')
+        sha1 = hashlib.sha1(raw).hexdigest()
+        with self.lock, self.db:
+            query = 'INSERT OR REPLACE INTO revisions VALUES (?, ?, ?)'
+            self.db.execute(query, (revid, timestamp, sha1))
+            query = 'UPDATE contents SET used = ? WHERE sha1 = ?'
+            if not self.db.execute(query, (time.time(), sha1)).rowcount:
+                data = zlib.compress(raw)
+                query = 'INSERT INTO contents VALUES (?, ?, ?, ?)'
+                self.db.execute(query, (sha1, data, len(data), time.time()))
+                self.size += len(data)
+            self._evict()
+
+    def _evict(self):
+        'Remove the least recently used contents beyond the size limit.'
+        if self.size <= self.max_size:
+            return
+        query = 'SELECT sha1, size FROM contents ORDER BY used'
+        evicted = []
+        for sha1, size in self.db.execute(query):
+            if self.size <= self.max_size:
+                break
+            evicted.append((sha1,))
+            self.size -= size
+        self.db.executemany('DELETE FROM contents WHERE sha1 = ?', evicted)
+        self.db.executemany('DELETE FROM revisions WHERE sha1 = ?', evicted)
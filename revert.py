@@ -2,19 +2,50 @@
 
 '''Revert wrong edits made by this robot.
 
+Read the titles from the input one by one, or pass a time window of the
+contributions to revert, optionally followed by a pattern of their edit
+summaries. The pages edited by someone else since are skipped. A run
+listed by journal.py, or all the runs of its job, may also be undone
+from the journal.
+
 Usage: {0} <page> <edit-summary> [minor]
+       {0} [start]..[end][~summary] <edit-summary> [minor] [--resume]
+       {0} <run:id|job:id> <edit-summary> [minor]
 Example: {0} CRH "Revert wrong edit" m
+Example: {0} 2020-05-01T08:00:00Z..~^Add "Revert wrong edits" m
+Example: {0} job:42 "Revert wrong edits" m
 '''
 
+import re
 import sys
-from bot import Bot, main
+import time
+import mwclient
+import metrics
+import prefetch
+from aiobot import AsyncBot
+from bot import Bot, EditConflict, main
 
 
-class RevertBot(Bot):
+class RevertBot(AsyncBot):
 
     def __call__(self, title, edit_summary, minor=False):
         'Fetch the pages.'
         super().__call__(edit_summary, minor)
+        started = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        if title.startswith(('run:', 'job:')):  # undo from the journal
+            self._undo_runs(self.journal.runs(title))
+            self._show_stat()
+            return
+        elif '..' in title:  # revert the contributions in bulk
+            window, _, pattern = title.partition('~')
+            start, _, end = window.partition('..')
+            end = end or started  # not the reverts made from now on
+            pages = self._contributions(start, end, pattern)
+            for page in self._crawl(self._revert, pages):
+                pass
+            self._show_stat()
+            return
+
         while True:
             try:
                 self._replace(self.site.pages[input('> ')])
@@ -31,11 +62,117 @@ class RevertBot(Bot):
         if last_revision['user'] != self.site.username:
             msg = 'Skip page "{0}" (last revision {1[revid]} by {1[user]}).'
             print(msg.format(page.name, last_revision))
-            self.ignored += 1
+            self._count('ignored')
         else:
             prev_revision = next(revisions)
             self._save(page, prev_revision['*'])
 
+    def _contributions(self, start='', end='', pattern=''):
+        'List the pages last edited by the bot, with their previous text.'
+        window = dict(start=start, end=end)
+        window = {key: value for key, value in window.items() if value}
+        contributions = prefetch.contributions(
+            self.site, self.site.username, self.checkpoint, dir='newer',
+            show='top', prop='ids|title|timestamp|comment', **window)
+        for position, items in contributions:
+            saved = self._saved()
+            items = [
+                item for item in items
+                if item.get('parentid')  # not the creation of the page
+                and not saved(item)
+                and re.search(pattern, item.get('comment', ''))]
+            if not items:
+                continue
+
+            # check the latest revisions, and get the previous ones in bulk
+            pages, _, _ = prefetch.query(
+                self.site, pageids='|'.join(str(i['pageid']) for i in items),
+                **prefetch.PrefetchList.info)
+            pages = {info.get('pageid'): info for info in pages}
+            parents, _, _ = prefetch.query(
+                self.site, revids='|'.join(str(i['parentid']) for i in items),
+                prop='revisions', rvprop='ids|content', rvslots='main')
+            texts = {
+                rev['revid']: rev.get('slots', {}).get('main', rev).get('*')
+                for info in parents for rev in info.get('revisions', ())}
+
+            for item in items:
+                info = pages.get(item['pageid'])
+                text = texts.get(item['parentid'])
+                if not info or info.get('lastrevid') != item['revid'] \
+                        or text is None:  # edited since, or hidden
+                    next(self)
+                    continue
+                # send the base timestamp to catch the later edits, too
+                info = dict(info, revisions=[{'timestamp': item['timestamp']}])
+                page = prefetch.PrefetchedPage(self.site, info['title'], info)
+                page.position = position
+                page.previous = text
+                yield page
+
+    def _saved(self):
+        'Tell the contributions made by this run, which are not to revert.'
+        if self.journal.run is None:  # not journaled, compare the summaries
+            return lambda item: item.get('comment') == self.edit_summary
+        actions = self.journal.actions([self.journal.run])
+        revids = {action.new_revid for action in actions}
+        return lambda item: item['revid'] in revids
+
+    def _revert(self, page):
+        'Restore the previous revision, unless someone has edited since.'
+        self._save(page, page.previous, '*')
+
+    def _undo_runs(self, runs):
+        'Undo the edits of the runs page by page, then the moves backwards.'
+        edits, created, moves = self.journal.undos(runs)
+        for _ in created:  # not deleted by the bot
+            next(self)
+        for _ in self.pool.imap(self._undo_edit, edits):
+            pass
+        for action in moves:
+            self._undo_move(action)
+
+    def _undo_edit(self, action):
+        'Undo the revisions of a page, unless a later edit conflicts.'
+        with self.saving:
+            self._undo(action)
+
+    @Bot._retry
+    @metrics.timed('save')
+    def _undo(self, action):
+        'Undo the revisions after the old one, in a single edit.'
+        flag = 'minor' if self.minor else 'notminor'
+        try:
+            response = self.site.post(
+                'edit', pageid=action.pageid, undo=action.new_revid,
+                undoafter=action.old_revid, summary=self.edit_summary,
+                bot=True, token=self.site.get_token('edit'),
+                **{flag: True}, **self.scheduler.params)
+        except mwclient.errors.APIError as err:
+            if err.code in {'undofailure', 'editconflict'}:
+                raise EditConflict(action.title) from err
+            raise
+        response = response['edit']
+        if 'newrevid' in response:  # not a null edit
+            self.journal.record(
+                'undo', action.title, action.pageid, response.get('oldrevid'),
+                response['newrevid'], self.edit_summary)
+        print('*', end='')
+        return response
+
+    @Bot._retry
+    @metrics.timed('move')
+    def _undo_move(self, action):
+        'Move the page back to its previous title.'
+        self.site.post(
+            'move', ('from', action.target), to=action.title,
+            reason=self.edit_summary, movetalk=True,
+            token=self.site.get_token('move'), **self.scheduler.params)
+        self.journal.record('move', action.target, action.pageid,
+                            summary=self.edit_summary, target=action.title)
+        print('#', end='')
+        return True
+
 
 if __name__ == '__main__':
     main(RevertBot)
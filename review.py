@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+'''Review the edits planned with --plan, then apply the approved ones.
+
+The review works offline, one diff at a time. The approved edits are
+applied concurrently, skipping the pages edited since they were planned.
+
+Usage: {0} [--apply]
+Example: {0} && {0} --apply
+'''
+
+import sys
+import colorama
+import prefetch
+from aiobot import AsyncBot
+from bot import Bot, EditConflict, main, read_config
+from plan import Plan
+
+
+class PlanBot(AsyncBot):
+
+    def __call__(self):
+        'Apply the approved edits, grouped by their summaries.'
+        super().__call__(None)
+        self.queue = Plan(**read_config('bot.ini', 'plan'))
+        groups = {}
+        for edit in self.queue.edits('approved'):
+            groups.setdefault((edit.summary, edit.minor), []).append(edit)
+
+        for (self.edit_summary, self.minor), edits in groups.items():
+            for ok in self.pool.imap(self._apply, self._check(edits)):
+                print('.' if ok else 'x', end='')
+
+        self._show_stat()
+
+    def _check(self, edits):
+        'Pair the edits with their pages, skipping the changed ones.'
+        step = prefetch.limit(self.site)
+        for i in range(0, len(edits), step):
+            batch = edits[i:i + step]
+            pageids = '|'.join(str(edit.pageid) for edit in batch)
+            pages, _, _ = prefetch.query(
+                self.site, pageids=pageids, **prefetch.PrefetchList.info)
+            pages = {info.get('pageid'): info for info in pages}
+            for edit in batch:
+                info = pages.get(edit.pageid)
+                if not info or info.get('lastrevid') != edit.revid:
+                    self.queue.mark(edit, 'conflict')
+                    self._count('ignored')
+                    continue
+                # send the base timestamp to catch the later conflicts
+                info = dict(info, revisions=[{'timestamp': edit.timestamp}])
+                yield edit, prefetch.PrefetchedPage(
+                    self.site, info['title'], info)
+
+    def _apply(self, item):
+        'Save an edit, and check it off.'
+        edit, page = item
+        try:
+            if self._save(page, edit.text, raise_conflicts=True):
+                self.queue.mark(edit, 'applied')
+                return True
+        except EditConflict:  # edited after the check
+            self.queue.mark(edit, 'conflict')
+            self._count('ignored')
+
+
+def review(plan):
+    'Approve or reject the pending edits one by one.'
+    colorama.init()
+    choice = None
+    for edit in plan.edits('pending'):
+        if choice != 'a':  # not approving all the rest
+            message = '\n{0.CYAN}{1.title}{0.GREEN} ({1.summary}){0.RESET}'
+            print(message.format(colorama.Fore, edit))
+            print('\n'.join(Bot._colorize(edit.diff.splitlines())))
+            choice = _choose()
+            if choice == 'q':
+                break
+        plan.mark(edit, 'rejected' if choice == 'n' else 'approved')
+    print(', '.join('%d %s' % (n, k) for k, n in plan.count().items()))
+
+
+def _choose():
+    'Ask for the decision on an edit.'
+    prompt = '{0.YELLOW}Approve? [Y/n/a/q]: {0.RESET}'.format(colorama.Fore)
+    choices = {'yes': 'y', '': 'y', 'no': 'n', 'all': 'a', 'quit': 'q'}
+    while True:
+        try:
+            choice = input(prompt).lower()
+        except EOFError:
+            choice = 'q'
+        choice = choices.get(choice, choice)
+        if choice in {'y', 'n', 'a', 'q'}:
+            return choice
+        Bot._invalid(choice)
+
+
+if __name__ == '__main__':
+    if '--apply' in sys.argv:
+        main(PlanBot, argc=1, argv=sys.argv[:1])
+    else:
+        review(Plan(**read_config('bot.ini', 'plan')))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+'''Central pacing of write requests.
+
+Every worker takes a token from a shared bucket before it writes, so
+the edit rate stays within the configured limit. When the server asks
+for a pause, with a Retry-After header, a throttling or maxlag error or
+a network failure, the pause applies to all the workers at once. The
+failures of a single page, such as a blacklisted link or an abuse
+filter, pause nothing and are not retried.
+'''
+
+import time
+import threading
+import mwclient
+import requests
+
+
+class WriteScheduler:
+
+    rate = 0  # edits per minute, unlimited by default
+    transient = {  # API error codes worth a retry after a pause
+        'maxlag', 'ratelimited', 'actionthrottled', 'readonly',
+        'internal_api_error_DBConnectionError',
+        'internal_api_error_DBQueryError',
+    }
+    network = (
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+        mwclient.errors.MaximumRetriesExceeded,
+        mwclient.errors.InvalidResponse,
+    )
+    burst = 1
+    maxlag = 5
+    interval = 10  # seconds, doubled on each consecutive failure
+    max_interval = 300
+
+    def __init__(self, site, rate=None, burst=None, maxlag=None,
+                 interval=None, max_interval=None):
+        'Watch the responses of the site for server hints.'
+        self.rate = rate or self.rate
+        self.burst = burst or self.burst
+        self.maxlag = maxlag or self.maxlag
+        self.interval = interval or self.interval
+        self.max_interval = max_interval or self.max_interval
+
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.resume = 0
+        self.waited = 0
+        site.connection.hooks['response'].append(self.observe)
+
+    @property
+    def params(self):
+        'Extra parameters for the write requests.'
+        return {'maxlag': self.maxlag} if self.maxlag else {}
+
+    def acquire(self):
+        'Wait until a write is allowed, then take a token from the bucket.'
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate:
+                    elapsed = now - self.updated
+                    self.tokens += elapsed * self.rate / 60
+                    self.tokens = min(self.tokens, self.burst)
+                self.updated = now
+
+                if now < self.resume:
+                    delay = self.resume - now
+                elif not self.rate:
+                    return
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    delay = (1 - self.tokens) * 60 / self.rate
+            self.waited += delay
+            time.sleep(delay)
+
+    def hold(self, seconds):
+        'Pause all writes for the given time.'
+        with self.lock:
+            self.resume = max(self.resume, time.monotonic() + seconds)
+
+    def failed(self, err, count=0):
+        'Back off after a transient failure, and tell if it is worth a retry.'
+        if not self.retriable(err):
+            return False
+        self.hold(min(self.interval * 2 ** count, self.max_interval))
+        return True
+
+    def retriable(self, err):
+        'Tell throttling, lag and network failures from those of a page.'
+        if isinstance(err, self.network):
+            return True
+        elif isinstance(err, requests.exceptions.HTTPError):
+            status = getattr(err.response, 'status_code', 0)
+            return status == 429 or status >= 500
+        code = getattr(err, 'code', None)
+        if code is None and err.__context__ is not None:  # EditError
+            code = getattr(err.__context__, 'code', None)
+        return code in self.transient
+
+    def observe(self, response, *args, **kwargs):
+        'Honour the Retry-After header of throttled or lagged responses.'
+        retry_after = response.headers.get('Retry-After')
+        throttled = response.status_code in {429, 503}
+        lagged = 'X-Database-Lag' in response.headers
+        if retry_after and (throttled or lagged):
+            try:
+                self.hold(float(retry_after))
+            except ValueError:  # an HTTP date instead of seconds
+                self.hold(self.interval)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+'''Cache of the login sessions, to start the bots quickly.
+
+The cookies, the CSRF token and the siteinfo of each host and user are
+kept in a file readable only by its owner. A cached session is checked
+with a single request for the user info and a fresh token. The bot
+signs in as usual only if the session has expired or is no longer
+valid.
+'''
+
+import json
+import time
+import mwclient
+import state
+
+
+class SessionCache:
+
+    path = 'session.json'
+    expiry = 86400  # seconds before the siteinfo is fetched again
+
+    def __init__(self, path=None, expiry=None):
+        'Locate the file of the sessions.'
+        self.path = path or state.path(self.path)
+        self.expiry = expiry or self.expiry
+
+    def restore(self, site, username=None):
+        'Put the cached session back into the site, if it is still valid.'
+        entry = self._read().get(self._key(site, username))
+        if not entry or time.time() - entry['time'] > self.expiry:
+            return False
+
+        for cookie in entry['cookies']:
+            site.connection.cookies.set(**cookie)
+        site.site = entry['site']
+        site.namespaces = {int(k): v for k, v in entry['namespaces'].items()}
+        site.version = site.version_tuple_from_generator(
+            site.site['generator'])
+        site.initialized = True
+
+        # one request to check the session and to get a fresh token
+        try:
+            info = site.get('query', meta='tokens', type='csrf',
+                            uiprop='groups|rights')['query']
+        except mwclient.errors.APIError:
+            return False
+        userinfo = info['userinfo']
+        if userinfo['name'] != entry['username']:  # signed out
+            site.connection.cookies.clear()
+            return False
+        site.username = userinfo['name']
+        site.groups = userinfo.get('groups', [])
+        site.rights = userinfo.get('rights', [])
+        site.tokens = {'csrf': info['tokens']['csrftoken']}
+        return True
+
+    def save(self, site, username=None):
+        'Cache the session of the site after signing in.'
+        sessions = self._read()
+        sessions[self._key(site, username)] = dict(
+            time=time.time(),
+            username=site.username,
+            site=site.site,
+            namespaces=site.namespaces,
+            cookies=[
+                dict(name=c.name, value=c.value, domain=c.domain,
+                     path=c.path, secure=c.secure, expires=c.expires)
+                for c in site.connection.cookies],
+        )
+        data = json.dumps(sessions, ensure_ascii=False).encode('utf-8')
+        state.write(self.path, data, 0o600)  # as good as a password
+
+    def _read(self):
+        'Load all the cached sessions.'
+        try:
+            with open(self.path, encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(site, username=None):
+        'Identify the sessions by user and site.'
+        return '%s@%s://%s%s' % (
+            username or '', site.scheme, site.host, site.path)
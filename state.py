@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+'''Location of the files kept by the bots between the runs.
+
+The login sessions, the revision store, the checkpoints, the plans, the
+journal and the pre-save transforms are kept in a directory readable only
+by its owner, $XDG_STATE_HOME/wiki-bot (~/.local/state/wiki-bot if it is
+not set), rather than in the working tree. The paths in bot.ini override
+the defaults.
+'''
+
+import os
+import sqlite3
+
+
+def path(name):
+    'Locate a file of the state, creating the directory if necessary.'
+    base = os.environ.get('XDG_STATE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.local', 'state')
+    directory = os.path.join(base, 'wiki-bot')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def connect(name, schema, override=None, wal=False):
+    'Open a database of the state, creating its tables if necessary.'
+    db = sqlite3.connect(override or path(name), check_same_thread=False)
+    if wal:  # readers do not wait for the writers
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+    db.executescript(schema)
+    return db
+
+
+def write(name, data, mode=0o666):
+    'Replace the file with the bytes at once, unless it is read-only.'
+    temp = '%s.%d.tmp' % (name, os.getpid())
+    try:
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with open(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(temp, name)
+    except OSError:  # a read-only directory, just go without the file
+        return False
+    return True
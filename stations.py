@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+'''Compiled index of the 12306 station database.
+
+The station_name.js file is parsed once into compact records, indexed
+by name, telegraph code and pinyin code, and pickled next to it. The
+pickle is used as long as the modification time and the size of the
+JavaScript file stay the same.
+
+Usage: {0} [station_name.js] <name or code>...
+Example: {0} 北京北 VAP BJB
+'''
+
+import os
+import sys
+import pickle
+import state
+
+
+class Station:
+
+    __slots__ = 'name', 'telecode', 'pinyin', 'spelling'
+
+    def __init__(self, name, telecode, pinyin, spelling):
+        'Keep the fields of a station.'
+        self.name = name
+        self.telecode = telecode
+        self.pinyin = pinyin
+        self.spelling = spelling
+
+    def __getstate__(self):
+        return tuple(getattr(self, i) for i in self.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return '<Station {0.name} {0.telecode} {0.pinyin}>'.format(self)
+
+
+class StationIndex:
+
+    version = 1  # of the pickle layout
+
+    def __init__(self, path='station_name.js', cache=None):
+        'Load the compiled index, rebuilding it if the file has changed.'
+        self.path = path
+        self.cache = cache or os.path.splitext(path)[0] + '.pickle'
+        stat = os.stat(path)
+        self.stamp = self.version, stat.st_mtime_ns, stat.st_size
+        if not self._load():
+            self._build()
+            self._dump()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return self.names[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, name, default=None):
+        'Look up a station by name.'
+        return self.names.get(name, default)
+
+    def by_telecode(self, code):
+        'Look up a station by telegraph code, e.g. VAP.'
+        return self.telecodes.get(code.upper())
+
+    def by_pinyin(self, code):
+        'List the stations sharing a pinyin code, e.g. BJB.'
+        return self.pinyin.get(code.upper(), [])
+
+    def _build(self):
+        'Parse the JavaScript file.'
+        # https://kyfw.12306.cn/otn/resources/js/framework/station_name.js
+        with open(self.path, encoding='utf-8') as fp:
+            # skip javascript stuff around single quotes
+            # skip the first '@' character in the string
+            packed_stations = fp.read().split("'")[1][1:]
+
+        self.names, self.telecodes, self.pinyin = {}, {}, {}
+        for s in packed_stations.split('@'):
+            lst = s.split('|')
+            station = Station(lst[1], lst[2], lst[0].upper(), lst[3])
+            self.names[station.name] = station
+            self.telecodes[station.telecode] = station
+            self.pinyin.setdefault(station.pinyin, []).append(station)
+
+    def _load(self):
+        'Read the pickle if it matches the JavaScript file.'
+        try:
+            with open(self.cache, 'rb') as fp:
+                stamp, self.names, self.telecodes, self.pinyin = \
+                    pickle.load(fp)
+        except (OSError, EOFError, ValueError, AttributeError, ImportError,
+                pickle.UnpicklingError):
+            return False
+        return stamp == self.stamp
+
+    def _dump(self):
+        'Write the pickle, replacing the old one at once.'
+        data = self.stamp, self.names, self.telecodes, self.pinyin
+        state.write(self.cache, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
+def main(argv=sys.argv):
+    'Look up the stations given on the command line.'
+    args = argv[1:]
+    path = args.pop(0) if args and args[0].endswith('.js') else None
+    if not args:
+        print(__doc__.format(argv[0]))
+        return
+    index = StationIndex(path or 'station_name.js')
+    for key in args:
+        found = [index.get(key), index.by_telecode(key)]
+        found += index.by_pinyin(key)
+        for station in filter(None, found):
+            print(station.name, station.telecode, station.pinyin,
+                  station.spelling, sep='\t')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import prefetch
+from checkpoint import Checkpoint
+from fakeapi import FakeWiki
+
+
+class Site:
+    'Send the requests to a fake wiki, 50 pages at a time.'
+    rights = []
+
+    def __init__(self, pages=120):
+        self.wiki = FakeWiki(pages, filler=0)
+
+    def post(self, action, **params):
+        return self.wiki(dict(params, action=action))
+
+
+def crawl(site, path, resume=False, stop=None):
+    'List the articles, marking them done until the given number.'
+    checkpoint = Checkpoint(path)
+    checkpoint.start(['Bot', 'summary'], resume)
+    pages = prefetch.PrefetchList(
+        site, 'embeddedin', 'ei', checkpoint=checkpoint, namespaces={0},
+        title='Template:Benchmark')
+    titles = []
+    for page in pages:
+        if len(titles) == stop:  # crash
+            break
+        titles.append(page.name)
+        checkpoint.done(page)
+    return titles
+
+
+def test_resume_from_the_batch_in_progress(tmp_path):
+    site, path = Site(), str(tmp_path / 'checkpoint.sqlite3')
+    titles = [FakeWiki.title(i) for i in range(120)]
+    assert crawl(site, path, stop=70) == titles[:70]
+    queries = site.wiki.calls['query']
+    assert crawl(site, path, resume=True) == titles[70:]
+    # the infos and then the contents of the last two batches
+    assert site.wiki.calls['query'] - queries == 4
+
+
+def test_start_over_unless_resumed(tmp_path):
+    site, path = Site(), str(tmp_path / 'checkpoint.sqlite3')
+    crawl(site, path, stop=70)
+    assert len(crawl(site, path)) == 120
+
+
+def test_skip_the_finished_pages_when_the_batch_changes(tmp_path):
+    site, path = Site(), str(tmp_path / 'checkpoint.sqlite3')
+    titles = [FakeWiki.title(i) for i in range(120)]
+    assert crawl(site, path, stop=60) == titles[:60]
+    site.wiki.save(titles[10], 'No template.')  # the batches shift
+    assert crawl(site, path, resume=True) == titles[60:]
@@ -0,0 +1,48 @@
+import difflib
+from bot import Bot
+
+TEXT = '\n'.join('line %d' % i for i in range(20)) + '\n'
+
+
+def unified(x, y, n=3):
+    return list(difflib.unified_diff(
+        x.splitlines(), y.splitlines(), lineterm='', n=n))
+
+
+def test_sub_keeps_spans():
+    result, spans = Bot._sub(r'line (1\d)', r'row \1', 'line 1\nline 12\n')
+    assert result == 'line 1\nrow 12\n'
+    assert spans == [(7, 14, 'row 12')]
+
+
+def test_sub_callable_repl():
+    result, spans = Bot._sub(
+        r'\d+', lambda m: str(int(m.group()) * 2), 'a1b22')
+    assert result == 'a2b44'
+    assert [repl for _, _, repl in spans] == ['2', '44']
+
+
+def test_str_replace():
+    result, spans = Bot._str_replace('abcabc', 'bc', 'X')
+    assert result == 'aXaX'
+    assert spans == [(1, 3, 'X'), (4, 6, 'X')]
+    assert Bot._str_replace('abc', '', 'X') == ('abc', [])
+
+
+def test_hunks_match_a_full_diff():
+    for pattern, repl in [
+        (r'line 2\n', ''),  # removed line
+        (r'line 5', 'line 5\nextra'),  # added line
+        (r'line (1[05])', r'LINE \1'),  # two hunks
+        (r'line (1[89])', r'LINE \1'),  # at the end
+        (r'line [34]', 'X'),  # overlapping contexts
+    ]:
+        result, spans = Bot._sub(pattern, repl, TEXT)
+        assert list(Bot._hunks(TEXT, spans)) == unified(TEXT, result)
+
+
+def test_hunks_of_unchanged_spans():
+    result, spans = Bot._sub(r'line 7', r'line 7', TEXT)
+    assert spans and result == TEXT
+    assert list(Bot._hunks(TEXT, spans)) == []
+    assert Bot._render(TEXT, result, spans, color=False) == ''
@@ -0,0 +1,66 @@
+from journal import Journal
+
+
+def journal(tmp_path):
+    return Journal(str(tmp_path / 'journal.sqlite3'))
+
+
+def ranges(edits):
+    return [(a.title, a.old_revid, a.new_revid) for a in edits]
+
+
+def test_nothing_is_recorded_outside_of_a_run(tmp_path):
+    j = journal(tmp_path)
+    j.record('edit', 'A', 1, 10, 11)
+    j.start(['Bot'])
+    assert j.actions([j.run]) == []
+
+
+def test_undo_a_range_of_revisions_per_page(tmp_path):
+    j = journal(tmp_path)
+    run = j.start(['Bot', 'summary'])
+    j.record('edit', 'A', 1, 10, 11)
+    j.record('edit', 'B', 2, 20, 21)
+    j.record('edit', 'A', 1, 11, 12)
+    edits, created, moves = j.undos(j.runs('run:%d' % run))
+    assert ranges(edits) == [('A', 10, 12), ('B', 20, 21)]
+    assert created == moves == []
+
+
+def test_undo_all_the_runs_of_a_job(tmp_path):
+    j = journal(tmp_path)
+    first = j.start(['Bot', 'summary'])
+    j.record('edit', 'A', 1, 10, 11)
+    j.start(['Other'])
+    j.record('edit', 'A', 1, 11, 12)
+    j.start(['Bot', 'summary'])
+    j.record('edit', 'A', 1, 12, 13)
+    j.record('edit', 'C', 3, 30, 31)
+
+    assert len(j.runs('job:%d' % first)) == 2
+    edits, _, _ = j.undos(j.runs('job:%d' % first))
+    assert ranges(edits) == [('A', 10, 13), ('C', 30, 31)]
+    edits, _, _ = j.undos(j.runs('run:%d' % first))
+    assert ranges(edits) == [('A', 10, 11)]
+
+
+def test_skip_the_pages_created_by_the_run(tmp_path):
+    j = journal(tmp_path)
+    run = j.start(['Bot'])
+    j.record('edit', 'New', 4, 0, 40)
+    j.record('edit', 'A', 1, 10, 11)
+    j.record('edit', 'New', 4, 40, 41)
+    edits, created, _ = j.undos([run])
+    assert ranges(edits) == [('A', 10, 11)]
+    assert ranges(created) == [('New', 0, 41)]
+
+
+def test_undo_the_moves_backwards(tmp_path):
+    j = journal(tmp_path)
+    run = j.start(['Mover'])
+    j.record('move', 'A', 1, target='B')
+    j.record('edit', 'A', 5, 0, 50)  # the redirect left behind
+    j.record('move', 'B', 1, target='C')
+    edits, created, moves = j.undos([run])
+    assert edits == []
+    assert [(m.title, m.target) for m in moves] == [('B', 'C'), ('A', 'B')]
@@ -0,0 +1,30 @@
+import random
+from matcher import Automaton
+
+
+def brute_force(keywords, text):
+    return {k for k in keywords if k and k in text}
+
+
+def test_overlapping_keywords():
+    a = Automaton(['he', 'she', 'his', 'hers'])
+    assert a.findall('ushers') == {'she', 'he', 'hers'}
+    assert a.search('ushers') == 'she'
+    assert a.search('nothing here') == 'he'
+    assert a.search('xyz') is None
+
+
+def test_failure_links_match_brute_force():
+    rng = random.Random(0)
+    for _ in range(200):
+        keywords = [''.join(rng.choice('ab') for _ in range(rng.randint(1, 4)))
+                    for _ in range(rng.randint(1, 6))]
+        text = ''.join(rng.choice('abc') for _ in range(30))
+        assert Automaton(keywords).findall(text) == brute_force(keywords, text)
+
+
+def test_templates():
+    banners = Automaton('{{' + tl for tl in ['WikiProject A', 'WPA'])
+    assert banners.search('{{WPA|class=B}}\ntalk') == '{{WPA'
+    assert banners.search('{{WikiProject B}}') is None
+    assert Automaton(['']).findall('text') == set()
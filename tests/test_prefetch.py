@@ -0,0 +1,45 @@
+import prefetch
+
+
+def test_filters():
+    assert prefetch.filters() == {}
+    assert prefetch.filters({10, 0}) == {'namespace': '0|10'}
+    assert prefetch.filters(redirects=False) == {
+        'filterredir': 'nonredirects'}
+    assert prefetch.filters({0}, True) == {
+        'namespace': '0', 'filterredir': 'redirects'}
+
+
+class Site:
+    rights = []
+
+
+def test_list_parameters():
+    pages = prefetch.PrefetchList(
+        Site(), 'embeddedin', 'ei', namespaces={0}, redirects=False,
+        title='Template:X')
+    assert pages.args == {
+        'generator': 'embeddedin', 'geititle': 'Template:X',
+        'geinamespace': '0', 'geifilterredir': 'nonredirects',
+        'geilimit': 50,
+    }
+
+
+def test_lookahead_keeps_the_order():
+    with prefetch.Lookahead(lambda x: x * 2, range(100), 3) as results:
+        assert list(results) == [x * 2 for x in range(100)]
+
+
+def test_lookahead_closes_the_source():
+    closed = []
+
+    def source():
+        try:
+            yield from range(1000)
+        finally:
+            closed.append(True)
+
+    with prefetch.Lookahead(str, source(), 2) as results:
+        assert next(iter(results)) == '0'
+    results.thread.join(1)
+    assert closed == [True]
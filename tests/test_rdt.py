@@ -0,0 +1,94 @@
+import re
+from fakeapi import FakeWiki
+from rdt import PSTCache, RDTConverter
+
+
+class Site:
+    'Send the requests to a fake wiki, optionally mangling the comments.'
+
+    # the substitutions of the pre-save transform, which skip the blocks
+    subst_pattern = r'''(?s)
+        <!--.*?(?:-->|$) | <(nowiki|pre)>.*?</\1>
+        | \{\{safesubst:(\w+)/safesubst\|([^{}]*)\}\}
+    '''
+
+    def __init__(self, strip_comments=False, subst=False):
+        self.wiki = FakeWiki(1)
+        self.strip_comments = strip_comments
+        self.subst = subst
+
+    def post(self, action, **params):
+        if self.strip_comments:
+            params['text'] = re.sub(r'<!--.*?-->', '', params['text'])
+        response = self.wiki(dict(params, action=action))
+        if self.subst:
+            text = response['parse']['text']
+            text['*'] = re.sub(self.subst_pattern, self.substitute, text['*'],
+                               flags=re.X)
+        return response
+
+    @staticmethod
+    def substitute(match):
+        if not match.group(2):  # a comment or a block
+            return match.group()
+        return '[%s %s]' % match.group(2, 3)
+
+
+def converter(tmp_path, site=None, **kwargs):
+    cache = PSTCache(str(tmp_path / 'pst.sqlite3'))
+    return RDTConverter(cache, site=site or Site(), **kwargs)
+
+
+def test_fragments_keep_templates_whole():
+    text = '{{BS-header|A}}\n{{BS-map\n|title=x\n|map=\n}}\nplain\n{{BS|'
+    assert RDTConverter._fragments(text) == [
+        '{{BS-header|A}}', '{{BS-map\n|title=x\n|map=\n}}', 'plain', '{{BS|']
+
+
+def test_fragments_keep_comments_and_blocks_whole():
+    text = ('<!--\n{{BS|x}}\n-->\n<pre style="a">\n{{BS|y\n</PRE>\n'
+            '<nowiki/>{{BS\n|z}}\n<nowiki>}}</nowiki>')
+    assert RDTConverter._fragments(text) == [
+        '<!--\n{{BS|x}}\n-->', '<pre style="a">\n{{BS|y\n</PRE>',
+        '<nowiki/>{{BS\n|z}}', '<nowiki>}}</nowiki>']
+
+
+def test_convert_leaves_comments_and_blocks_alone(tmp_path):
+    text = ('{{BS|STR}}\n<!-- old rows\n{{BS|BHF}}\n-->\n'
+            '<nowiki>\n{{BS|KBHFe}}\n</nowiki>\n{{BS|KBHFa}}')
+    bot = converter(tmp_path, Site(subst=True))
+    whole = bot._parse_pst(bot._add_safesubst(text))
+    assert bot.convert([text]) == [bot._wrap(whole.strip())]
+    assert '{{safesubst:BS/safesubst|BHF}}' in whole
+    assert '[BS KBHFa]' in whole
+
+
+def test_parse_batch(tmp_path):
+    bot = converter(tmp_path)
+    batch = ['{{BS|STR}}', '', '{{BS-map\n|map=\n}}']
+    assert bot._parse_batch(batch) == batch
+    assert bot.site.wiki.calls['parse'] == 1
+
+
+def test_parse_batch_with_mangled_separators(tmp_path):
+    bot = converter(tmp_path, Site(strip_comments=True))
+    batch = ['{{BS|STR}}', '{{BS|BHF}}']
+    assert bot._parse_batch(batch) == batch
+    assert bot.site.wiki.calls['parse'] == 3  # one by one after the batch
+
+
+def test_batches_are_limited(tmp_path):
+    bot = converter(tmp_path, batch_size=2, batch_bytes=10)
+    batches = list(bot._batches(['12345', '1234', '1', '123456789012']))
+    assert batches == [['12345', '1234'], ['1'], ['123456789012']]
+
+
+def test_convert_shares_and_caches(tmp_path):
+    texts = ['{{BS-table}}\n{{BS|STR}}\n{{BS|BHF}}', '{{BS|STR}}\nabc']
+    bot = converter(tmp_path)
+    first = bot.convert(texts)
+    assert bot.site.wiki.calls['parse'] == 1
+    assert first[1] == '{{safesubst:BS/safesubst|STR}}\nabc\n}}'
+    again = converter(tmp_path)
+    assert again.convert(texts) == first
+    assert again.site.wiki.calls['parse'] == 0
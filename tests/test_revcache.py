@@ -0,0 +1,56 @@
+import time
+import zlib
+from revcache import RevisionStore
+
+
+def store(tmp_path, max_size=None):
+    return RevisionStore(str(tmp_path / 'revisions.sqlite3'), max_size)
+
+
+def size(text):
+    return len(zlib.compress(text.encode('utf-8')))
+
+
+def test_get_and_put(tmp_path):
+    s = store(tmp_path)
+    assert s.get(1) is None
+    s.put(1, '2020-01-01T00:00:00Z', '文本')
+    assert s.get(1) == ('2020-01-01T00:00:00Z', '文本')
+    assert (s.hits, s.misses) == (1, 1)
+
+
+def test_identical_revisions_share_the_contents(tmp_path):
+    s = store(tmp_path)
+    s.put(1, 't1', 'same')
+    s.put(2, 't2', 'other')
+    s.put(3, 't3', 'same')  # a revert
+    assert s.size == size('same') + size('other')
+    assert s.get(3) == ('t3', 'same')
+
+
+def test_evict_the_least_recently_used(tmp_path):
+    texts = ['a' * 100, 'b' * 100, 'c' * 100]
+    s = store(tmp_path, max_size=2 * size(texts[0]))
+    s.put(1, 't', texts[0])
+    time.sleep(0.01)
+    s.put(2, 't', texts[1])
+    time.sleep(0.01)
+    s.get(1)  # used again, so the second is the oldest
+    time.sleep(0.01)
+    s.put(3, 't', texts[2])
+    assert s.get(2) is None
+    assert s.get(1) == ('t', texts[0])
+    assert s.get(3) == ('t', texts[2])
+    assert s.size <= s.max_size
+
+
+def test_size_is_kept_between_the_runs(tmp_path):
+    s = store(tmp_path)
+    s.put(1, 't', 'x' * 1000)
+    s.put(2, 't', 'y' * 1000)
+    again = store(tmp_path, max_size=size('x' * 1000))
+    assert again.size == s.size
+    again.put(3, 't', 'z')
+    assert again.size <= again.max_size
+    assert again.get(1) is None
+    assert again.get(3) == ('t', 'z')
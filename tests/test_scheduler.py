@@ -0,0 +1,88 @@
+import time
+import types
+import mwclient
+import requests
+import pytest
+from scheduler import WriteScheduler
+
+
+def scheduler(**kwargs):
+    site = types.SimpleNamespace(
+        connection=types.SimpleNamespace(hooks={'response': []}))
+    return WriteScheduler(site, **kwargs)
+
+
+def api_error(code):
+    return mwclient.errors.APIError(code, 'info', {})
+
+
+def edit_error(code):
+    'An EditError raised while handling an APIError, as mwclient does.'
+    try:
+        try:
+            raise api_error(code)
+        except mwclient.errors.APIError:
+            raise mwclient.errors.EditError('page', 'summary', 'info')
+    except mwclient.errors.EditError as err:
+        return err
+
+
+@pytest.mark.parametrize('err', [
+    api_error('maxlag'),
+    api_error('ratelimited'),
+    requests.exceptions.ConnectionError(),
+    requests.exceptions.ReadTimeout(),
+    mwclient.errors.MaximumRetriesExceeded(),
+])
+def test_transient_failures_hold_all_writes(err):
+    s = scheduler(interval=10)
+    assert s.failed(err, 1)
+    assert s.resume - time.monotonic() > 19
+
+
+@pytest.mark.parametrize('err', [
+    api_error('spamblacklist'),
+    api_error('abusefilter-disallowed'),
+    mwclient.errors.ProtectedPageError('page', 'protectedpage', 'info'),
+    edit_error('editconflict'),
+    mwclient.errors.EditError('page', {'result': 'Failure'}),
+])
+def test_page_failures_are_not_retried(err):
+    s = scheduler()
+    assert not s.failed(err)
+    assert s.resume == 0
+
+
+def test_http_errors():
+    s = scheduler()
+    for status, retriable in (429, True), (503, True), (404, False):
+        response = requests.Response()
+        response.status_code = status
+        err = requests.exceptions.HTTPError(response=response)
+        assert s.retriable(err) is retriable
+
+
+def test_rate_limit():
+    s = scheduler(rate=600, burst=2)  # one token every 0.1 seconds
+    start = time.monotonic()
+    for _ in range(4):
+        s.acquire()
+    elapsed = time.monotonic() - start
+    assert 0.15 < elapsed < 0.5
+    assert s.waited > 0
+
+
+def test_unlimited_by_default():
+    s = scheduler()
+    for _ in range(100):
+        s.acquire()
+    assert s.waited == 0
+
+
+def test_retry_after():
+    s = scheduler()
+    response = requests.Response()
+    response.status_code = 429
+    response.headers['Retry-After'] = '30'
+    s.observe(response)
+    assert 29 < s.resume - time.monotonic() <= 30
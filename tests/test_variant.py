@@ -0,0 +1,67 @@
+import json
+from variant import ConversionTable, VariantConverter
+
+
+class Site:
+    'Convert the lines of the wikitext by tagging them with the variant.'
+
+    def __init__(self):
+        self.requests = []
+
+    def post(self, action, text, variant, **kwargs):
+        self.requests.append(text)
+        lines = text.replace(VariantConverter.line_prefix, '').split('\n')
+        output = ''.join('<p>%s/%s</p>\n' % (line, variant) for line in lines)
+        return {'parse': {'text': {'*': output}}}
+
+
+def converter(tmp_path, **kwargs):
+    return VariantConverter(Site(), tables=str(tmp_path / 'none'), **kwargs)
+
+
+def test_batches_and_deduplicates(tmp_path):
+    v = converter(tmp_path, batch_size=2)
+    result = v(['a', 'b', 'a', 'c'], 'zh-cn,zh-tw')
+    assert list(result) == ['a', 'b', 'c']
+    assert result['b'] == {'b/zh-cn', 'b/zh-tw'}
+    assert v.requests == 4  # two batches for each dialect
+
+
+def test_cache_smaller_than_batch(tmp_path):
+    v = converter(tmp_path, batch_size=10, cache_size=2)
+    titles = list('abcdefg')
+    result = v.convert(titles, 'zh-hk')
+    assert list(result.values()) == [t + '/zh-hk' for t in titles]
+    assert len(v.cache) == 2
+    assert v.requests == 1
+
+
+def test_cache_hits(tmp_path):
+    v = converter(tmp_path)
+    v.convert(['a', 'b'], 'zh-cn')
+    assert v.convert(['b', 'a'], 'zh-cn') == {'b': 'b/zh-cn', 'a': 'a/zh-cn'}
+    assert v.requests == 1
+
+
+def test_tables_with_fallback(tmp_path):
+    path = tmp_path / 'tables.json'
+    path.write_text(json.dumps({
+        'zh2Hans': {'車': '车', '車站': '车站', '臺': '台'},
+        'zh2TW': {'台': '臺'},
+    }), encoding='utf-8')
+    v = VariantConverter(Site(), tables=str(path))
+    result = v.convert(['臺北車站', '-{臺}-北', '東京'], 'zh-cn')
+    assert result['臺北車站'] == '台北车站'
+    assert result['東京'] == '東京'  # resolved, as nothing is to convert
+    assert result['-{臺}-北'] == '-{臺}-北/zh-cn'  # by the parser
+    assert v.requests == 1
+
+    # no tables for the dialect, everything is sent
+    assert v.convert(['車'], 'zh-hk') == {'車': '車/zh-hk'}
+    assert v.requests == 2
+
+
+def test_maximal_match():
+    table = ConversionTable({'zh2Hant': {'干': '幹', '干涉': '干涉'}})
+    assert table.convert('干涉干', 'zh-tw') == '干涉幹'
+    assert table.convert('干', 'zh-cn') is None
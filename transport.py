@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+'''HTTP transport shared by the workers of a bot.
+
+The connection pool of the session is sized to the concurrency of the
+bot, so that the workers reuse kept-alive connections instead of opening
+a new TLS connection each. Compressed responses are accepted, every
+request has a connect and a read timeout, and the use of the pool is
+counted for the metrics.
+'''
+
+import requests.adapters
+
+
+class Adapter(requests.adapters.HTTPAdapter):
+
+    def stats(self):
+        'Count the connections opened and the requests sent through them.'
+        stats = dict(pools=0, connections=0, requests=0, idle=0)
+        pools = self.poolmanager.pools
+        for pool in filter(None, map(pools.get, pools.keys())):
+            stats['pools'] += 1
+            stats['connections'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+            if pool.pool is not None:  # open connections, not free slots
+                stats['idle'] += sum(1 for conn in list(pool.pool.queue)
+                                     if conn)
+        return stats
+
+
+class Transport:
+
+    size = 10  # connections kept alive per host
+    block = False  # wait for a free connection instead of opening one more
+    compress = True
+    connect_timeout = 10  # seconds
+    read_timeout = 60
+
+    def __init__(self, size=None, block=None, compress=None,
+                 connect_timeout=None, read_timeout=None):
+        'Prepare a connection pool of the size.'
+        self.size = size or self.size
+        self.block = self.block if block is None else block
+        self.compress = self.compress if compress is None else compress
+        self.connect_timeout = connect_timeout or self.connect_timeout
+        self.read_timeout = read_timeout or self.read_timeout
+        self.adapter = Adapter(pool_maxsize=self.size, pool_block=self.block)
+
+    @property
+    def options(self):
+        'Extra arguments for the requests of mwclient.'
+        return {'timeout': (self.connect_timeout, self.read_timeout)}
+
+    def mount(self, session):
+        'Send the requests of the session through the pool.'
+        for scheme in 'http://', 'https://':
+            session.mount(scheme, self.adapter)
+        session.headers['Connection'] = 'keep-alive'
+        session.headers['Accept-Encoding'] = (
+            'gzip, deflate' if self.compress else 'identity')
+
+    def stats(self):
+        'Count the connections and the requests, for the metrics.'
+        return self.adapter.stats()
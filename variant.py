@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+'''Conversion between Chinese language variants.
+
+The titles are converted locally with the wiki's conversion tables, if
+they have been exported. The other titles, or those with conversion
+markup, are converted in batches of parse requests.
+
+Usage: {0} <ZhConversion.php> [tables.json] [host]
+Example: {0} languages/data/ZhConversion.php zhconversion.json zh.wikipedia.org
+'''
+
+import os
+import re
+import sys
+import json
+import html
+import collections
+import metrics
+
+
+class VariantConverter:
+
+    dialects = 'zh-cn,zh-hk,zh-mo,zh-sg,zh-tw'
+    batch_size = 50
+    cache_size = 10000
+
+    # the titles are sent as lines of a single wikitext document
+    tag_pattern = r'<[^>]*>'
+    line_prefix = '<nowiki/>'
+
+    def __init__(self, site, batch_size=None, cache_size=None, tables=None):
+        'Load the local tables, and prepare an empty LRU cache.'
+        self.site = site
+        self.batch_size = batch_size or self.batch_size
+        self.cache_size = cache_size or self.cache_size
+        self.cache = collections.OrderedDict()
+        self.requests = 0
+        self.tables = ConversionTable.load(tables)
+
+    def __call__(self, titles, dialects=None):
+        'Map each title to the set of its language variants.'
+        if dialects is None:
+            dialects = self.dialects
+        if isinstance(dialects, str):
+            dialects = dialects.split(',')
+
+        titles = list(collections.OrderedDict.fromkeys(titles))
+        result = collections.OrderedDict((t, set()) for t in titles)
+        for dialect in dialects:
+            for title, converted in self.convert(titles, dialect).items():
+                result[title].add(converted)
+        return result
+
+    def convert(self, titles, dialect):
+        'Convert the titles into the dialect, querying only what is unknown.'
+        result = collections.OrderedDict()
+        missing = []
+        for title in titles:
+            converted = self.local(title, dialect)
+            if converted is not None:
+                result[title] = converted
+                continue
+            try:
+                result[title] = self._lookup(title, dialect)
+            except KeyError:
+                missing.append(title)
+
+        # the results are taken from the batches, not read back from the
+        # cache, which may be smaller than a batch
+        missing = list(collections.OrderedDict.fromkeys(missing))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            lines = self._parse(batch, dialect)
+            if lines is None:  # the markup is mangled, convert one by one
+                lines = [self._displaytitle(t, dialect) for t in batch]
+            for title, converted in zip(batch, lines):
+                result[title] = converted
+                self._store(title, dialect, converted)
+        return collections.OrderedDict((t, result[t]) for t in titles)
+
+    def local(self, title, dialect):
+        'Convert the title with the local tables only, or return None.'
+        if self.tables is None:
+            return None
+        return self.tables.convert(title, dialect)
+
+    def _lookup(self, title, dialect):
+        'Get a cached conversion and mark it as recently used.'
+        key = title, dialect
+        value = self.cache.pop(key)
+        self.cache[key] = value
+        return value
+
+    def _store(self, title, dialect, converted):
+        'Cache a conversion, evicting the least recently used ones.'
+        self.cache[title, dialect] = converted
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    @metrics.timed('convert')
+    def _parse(self, titles, dialect):
+        'Convert a batch of titles with a single parse request, or None.'
+        self.requests += 1
+        text = '\n'.join(self.line_prefix + t for t in titles)
+        output = self.site.post(
+            'parse', text=text, contentmodel='wikitext', prop='text',
+            disablelimitreport=True, uselang=dialect, variant=dialect,
+        )['parse']['text']['*']
+        lines = html.unescape(re.sub(self.tag_pattern, '', output))
+        lines = [line.strip() for line in lines.splitlines() if line.strip()]
+        if len(lines) == len(titles):
+            return lines
+        return None
+
+    @metrics.timed('convert')
+    def _displaytitle(self, title, dialect):
+        'Convert a single title with its display title.'
+        self.requests += 1
+        output = self.site.get(
+            'parse', title=title, uselang=dialect
+        )['parse']['displaytitle']
+        return html.unescape(re.sub(self.tag_pattern, '', output))
+
+
+class ConversionTable:
+
+    path = 'zhconversion.json'
+
+    # the regional tables override the script ones, as in LanguageZh.php
+    layers = {
+        'zh-hans': ['zh2Hans', 'zh-hans'],
+        'zh-hant': ['zh2Hant', 'zh-hant'],
+        'zh-cn': ['zh2Hans', 'zh2CN', 'zh-hans', 'zh-cn'],
+        'zh-sg': ['zh2Hans', 'zh2CN', 'zh-hans', 'zh-sg'],
+        'zh-my': ['zh2Hans', 'zh2CN', 'zh-hans', 'zh-my'],
+        'zh-hk': ['zh2Hant', 'zh2HK', 'zh-hant', 'zh-hk'],
+        'zh-mo': ['zh2Hant', 'zh2HK', 'zh-hant', 'zh-mo'],
+        'zh-tw': ['zh2Hant', 'zh2TW', 'zh-hant', 'zh-tw'],
+    }
+
+    markup = '-{'  # manual conversions, which only the parser applies
+    php_pattern = r'\$(zh2\w+)\s*=\s*(?:\[|array\s*\()(.*?)(?:\]|\));'
+    pair_pattern = r"'((?:[^'\\]|\\.)*)'\s*=>\s*'((?:[^'\\]|\\.)*)'"
+    rule_pattern = r'^\s*\*\s*([^=\n]+?)\s*=>\s*([^;\n]+?)\s*;'
+
+    def __init__(self, tables):
+        'Prepare the mappings of the dialects lazily.'
+        self.tables = tables
+        self.mappings = {}
+
+    @classmethod
+    def load(cls, path=None):
+        'Read the exported tables, if there are any.'
+        path = path or cls.path
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as fp:
+            return cls(json.load(fp))
+
+    def covers(self, dialect):
+        'Tell if the dialect can be converted locally.'
+        return self._mapping(dialect.lower()) is not None
+
+    def convert(self, text, dialect):
+        'Convert the text by maximal matches, or return None if unknown.'
+        if not self.covers(dialect) or self.markup in text:
+            return None
+        mapping, lengths = self._mapping(dialect.lower())
+        pieces, i, n = [], 0, len(text)
+        while i < n:
+            for length in lengths.get(text[i], ()):
+                converted = mapping.get(text[i:i + length])
+                if converted is not None:
+                    pieces.append(converted)
+                    i += length
+                    break
+            else:
+                pieces.append(text[i])
+                i += 1
+        return ''.join(pieces)
+
+    def _mapping(self, dialect):
+        'Merge the layers of the dialect, indexed by the first characters.'
+        if dialect not in self.mappings:
+            layers = self.layers.get(dialect, ())
+            if not any(layer in self.tables for layer in layers):
+                self.mappings[dialect] = None
+                return None
+            mapping = {}
+            for layer in layers:
+                mapping.update(self.tables.get(layer, {}))
+            lengths = collections.defaultdict(set)
+            for key in mapping:
+                if key:
+                    lengths[key[0]].add(len(key))
+            lengths = {c: sorted(s, reverse=True) for c, s in lengths.items()}
+            self.mappings[dialect] = mapping, lengths
+        return self.mappings[dialect]
+
+    @classmethod
+    def export(cls, source, path=None, site=None):
+        'Extract the tables of ZhConversion.php and the wiki into JSON.'
+        with open(source, encoding='utf-8') as fp:
+            php = fp.read()
+        tables = {}
+        for name, body in re.findall(cls.php_pattern, php, re.S):
+            tables[name] = {
+                unescape(k): unescape(v)
+                for k, v in re.findall(cls.pair_pattern, body)}
+
+        # the customized rules of the wiki, in MediaWiki:Conversiontable
+        for dialect in cls.layers if site else ():
+            page = site.pages['MediaWiki:Conversiontable/' + dialect]
+            if page.exists:
+                rules = re.findall(cls.rule_pattern, page.text(), re.M)
+                tables[dialect] = dict(rules)
+
+        with open(path or cls.path, 'w', encoding='utf-8') as fp:
+            json.dump(tables, fp, ensure_ascii=False)
+        return tables
+
+
+def unescape(literal):
+    'Unescape a single-quoted PHP string.'
+    return re.sub(r"\\([\\'])", r'\1', literal)
+
+
+def main(argv=sys.argv):
+    'Export the conversion tables.'
+    if not 2 <= len(argv) <= 4:
+        print(__doc__.format(argv[0]))
+        return
+    site = None
+    if len(argv) > 3:
+        import mwclient
+        site = mwclient.Site(argv[3])
+    path = argv[2] if len(argv) > 2 else None
+    tables = ConversionTable.export(argv[1], path, site)
+    for name, table in tables.items():
+        print(name, len(table), sep='\t')
+
+
+if __name__ == '__main__':
+    main()